@@ -9,12 +9,14 @@ const Dashboard = ({ user, formData, setFormData }) => {
   const [currentStep, setCurrentStep] = useState(1);
   const [soilTypes, setSoilTypes] = useState({});
   const [crops, setCrops] = useState({});
+  const [irrigationEfficiency, setIrrigationEfficiency] = useState({});
   const [loading, setLoading] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchSoilTypes();
     fetchCrops();
+    fetchIrrigationMethods();
   }, []);
 
   const fetchSoilTypes = async () => {
@@ -35,6 +37,15 @@ const Dashboard = ({ user, formData, setFormData }) => {
     }
   };
 
+  const fetchIrrigationMethods = async () => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/irrigation-methods`);
+      setIrrigationEfficiency(response.data);
+    } catch (error) {
+      console.error('Error fetching irrigation methods:', error);
+    }
+  };
+
   const handleNext = () => {
     if (validateCurrentStep() && currentStep < 6) {
       setCurrentStep(currentStep + 1);
@@ -856,7 +867,7 @@ const Dashboard = ({ user, formData, setFormData }) => {
   };
 
   // Minimalistic Farm Size Info Component
-  const FarmSizeInfo = ({ formData, updateFormData }) => {
+  const FarmSizeInfo = ({ formData, updateFormData, irrigationEfficiency }) => {
     const [data, setData] = useState({
       area: formData.farm_size?.area || '',
       unit: formData.farm_size?.unit || 'hectares',
@@ -875,6 +886,17 @@ const Dashboard = ({ user, formData, setFormData }) => {
       { value: 'flood', label: 'Flood', icon: '🌊', desc: 'Traditional' },
       { value: 'furrow', label: 'Furrow', icon: '🚜', desc: 'Row crops' }
     ];
+    // Methods the backend adds later show up after the built-in ones
+    Object.keys(irrigationEfficiency || {}).forEach(value => {
+      if (!irrigationMethods.some(method => method.value === value)) {
+        irrigationMethods.push({
+          value,
+          label: value.charAt(0).toUpperCase() + value.slice(1),
+          icon: '💦',
+          desc: `${Math.round(irrigationEfficiency[value] * 100)}% efficient`
+        });
+      }
+    });
 
     const getAreaConversion = () => {
       if (!data.area) return '';
@@ -1130,7 +1152,7 @@ const Dashboard = ({ user, formData, setFormData }) => {
       case 4:
         return <CropInfo formData={formData} updateFormData={updateFormData} crops={crops} />;
       case 5:
-        return <FarmSizeInfo formData={formData} updateFormData={updateFormData} />;
+        return <FarmSizeInfo formData={formData} updateFormData={updateFormData} irrigationEfficiency={irrigationEfficiency} />;
       case 6:
         return <ReviewInfo formData={formData} soilTypes={soilTypes} crops={crops} />;
       default:
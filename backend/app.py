@@ -1,6 +1,6 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, request, jsonify, Response
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
+import io
 import os
 import json
 from datetime import datetime, timedelta  # ADD THIS IMPORT
@@ -10,18 +10,26 @@ from models.irrigation_calculator import IrrigationCalculator
 from models.data_models import *
 
 # New import
-from utils.soil_image_processor import SoilImageClassifier
+from utils.soil_image_processor import SoilImageClassifier, decode_image
 
 # Add these at the top
-from database import db, Report, RetentionSetting
+from database import db, Report, RetentionSetting, FarmState
 from apscheduler.schedulers.background import BackgroundScheduler
 import uuid
 
 import traceback
 from utils.json_encoder import NpEncoder
+from utils.weather_prefetch import collect_recent_locations, prefetch_weather
+
+
+class InMemoryUploadRequest(Request):
+    """Buffer multipart file parts in memory instead of spooling large ones to temp files"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 #CORS(app, origins=["*"])
 CORS(app, origins=["https://krishi-jal.vercel.app"])
 
@@ -59,19 +67,40 @@ def cleanup_reports():
 
 scheduler.add_job(cleanup_reports, 'interval', hours=12)
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
+# Weather prefetch: warm the cache for active locations before the morning rush
+PREFETCH_LOOKBACK_DAYS = int(os.getenv('WEATHER_PREFETCH_LOOKBACK_DAYS', 7))
+PREFETCH_MAX_PER_MINUTE = int(os.getenv('WEATHER_PREFETCH_MAX_PER_MINUTE', 30))
+PREFETCH_MAX_LOCATIONS = int(os.getenv('WEATHER_PREFETCH_MAX_LOCATIONS', 200))
+
+def prefetch_weather_job():
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(days=PREFETCH_LOOKBACK_DAYS)
+        reports = Report.query.filter(Report.created_at >= cutoff)\
+                   .order_by(Report.created_at.desc()).all()
+        locations = collect_recent_locations(reports)
+    
+    prefetch_weather(
+        calculator, locations,
+        max_per_minute=PREFETCH_MAX_PER_MINUTE,
+        max_locations=PREFETCH_MAX_LOCATIONS
+    )
+
+# Uploaded images are decoded in memory and never written to disk
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Create upload directory
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
 # Initialize calculators
 calculator = IrrigationCalculator()
 soil_classifier = SoilImageClassifier()
 
+# Runs at :30 of each listed hour so forecasts stay fresh through 6-8 AM
+scheduler.add_job(
+    prefetch_weather_job, 'cron',
+    hour=os.getenv('WEATHER_PREFETCH_HOURS', '5-7'), minute=30,
+    timezone=os.getenv('WEATHER_PREFETCH_TIMEZONE', 'Asia/Kolkata'),
+    max_instances=1, coalesce=True
+)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -94,11 +123,15 @@ def login():
 
 @app.route('/api/soil-types', methods=['GET'])
 def get_soil_types():
-    return jsonify(SOIL_TYPES)
+    return jsonify(calculator.parameters.soil_types)
 
 @app.route('/api/crops', methods=['GET'])
 def get_crops():
-    return jsonify(CROP_DATABASE)
+    return jsonify(calculator.parameters.crops)
+
+@app.route('/api/irrigation-methods', methods=['GET'])
+def get_irrigation_methods():
+    return jsonify(IRRIGATION_EFFICIENCY)
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
@@ -155,17 +188,18 @@ def classify_soil():
         if file.content_length and file.content_length > 2 * 1024 * 1024:  # 2MB limit
             return jsonify({'error': 'File too large. Max 2MB allowed.'}), 400
         
-        # Save temporary file
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_path)
+        # Read the upload into memory; the part's content_length is often unset
+        image_data = file.read(2 * 1024 * 1024 + 1)
+        if len(image_data) > 2 * 1024 * 1024:
+            return jsonify({'error': 'File too large. Max 2MB allowed.'}), 400
         
         try:
             # FAST FALLBACK: Use lightweight analysis instead of heavy ML
-            result = quick_soil_analysis(temp_path)
+            result = quick_soil_analysis(image_data)
             
             # Get soil properties
-            soil_properties = SOIL_TYPES.get(result['predicted_class'], SOIL_TYPES.get('Loam', {
+            soil_types = calculator.parameters.soil_types
+            soil_properties = soil_types.get(result['predicted_class'], soil_types.get('Loam', {
                 'water_holding_capacity': 'Medium',
                 'infiltration_rate': 'Moderate', 
                 'field_capacity': 0.25,
@@ -173,9 +207,6 @@ def classify_soil():
                 'description': 'Good for most crops'
             }))
             
-            # Clean up immediately
-            os.remove(temp_path)
-            
             return jsonify({
                 'success': True,
                 'predicted_soil_type': result['predicted_class'],
@@ -188,11 +219,6 @@ def classify_soil():
             print(f"Processing error: {processing_error}")
             
             # ULTIMATE FALLBACK: Return safe default
-            try:
-                os.remove(temp_path)
-            except:
-                pass
-                
             return jsonify({
                 'success': True,
                 'predicted_soil_type': 'Loam',
@@ -208,25 +234,18 @@ def classify_soil():
             })
         
     except Exception as e:
-        # Clean up on any error
-        try:
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-        except:
-            pass
-        
         print(f"Classification failed: {str(e)}")
         return jsonify({'error': f'Classification failed: {str(e)}'}), 500
 
 # ADD THIS NEW FUNCTION for fast analysis
-def quick_soil_analysis(image_path):
-    """Fast color-based soil classification to avoid timeouts"""
+def quick_soil_analysis(image_source):
+    """Fast color-based soil classification of image bytes, a file-like upload or a path"""
     try:
         import cv2
         import numpy as np
         
-        # Quick image analysis
-        img = cv2.imread(image_path)
+        # Quick image analysis, decoded in memory
+        img = decode_image(image_source)
         if img is None:
             raise ValueError("Could not read image")
             
@@ -304,13 +323,13 @@ def select_soil_manual():
         data = request.get_json()
         soil_type = data.get('soil_type')
         
-        if soil_type not in SOIL_TYPES:
+        if soil_type not in calculator.parameters.soil_index:
             return jsonify({'error': 'Invalid soil type'}), 400
         
         return jsonify({
             'success': True,
             'selected_soil_type': soil_type,
-            'soil_properties': SOIL_TYPES[soil_type],
+            'soil_properties': calculator.parameters.soil_types[soil_type],
             'method': 'manual_selection'
         })
         
@@ -321,56 +340,332 @@ def select_soil_manual():
 def get_weather(location):
     try:
         weather_data = calculator.get_weather_data(location)
-        return jsonify(weather_data)
+        # The packed hourly block is for the ET engine, not for clients
+        return jsonify([{key: value for key, value in day.items() if key != 'hourly'} for day in weather_data])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        'weather_cache': calculator.weather_client.cache.stats(),
+        'weather_client': calculator.weather_client.stats(),
+        'schedule_cache': calculator.schedule_cache.stats(),
+        'parameters': calculator.parameters.stats(),
+        # Only present once a batch has loaded the trained models
+        'ml_models': calculator.forest_predictor.stats() if calculator.forest_predictor else None
+    })
+
+def build_report(data, schedule, summary):
+    """Create a Report row for a generated schedule (caller adds and commits)"""
+    return Report(
+        id=str(uuid.uuid4()),
+        phone_number=data.get('personal_info', {}).get('phone', 'unknown'),
+        report_data={
+            'schedule': schedule,
+            'summary': {
+                **summary,
+                'schedule': schedule,  # Include schedule in summary
+                'user_data': {
+                    'crop_info': data.get('crop_info', {}),
+                    'soil_type': data.get('soil_type', ''),
+                    'location': data.get('location', {}),
+                    'farm_size': data.get('farm_size', {}),
+                    'personal_info': data.get('personal_info', {})
+                }
+            }
+        },
+        created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + timedelta(days=30)
+    )
+
+MAX_ENSEMBLE_MEMBERS = int(os.getenv('MAX_ENSEMBLE_MEMBERS', 2000))
+
 @app.route('/api/generate-schedule', methods=['POST'])
 def generate_schedule():
     try:
         data = request.get_json()
         
+        # Opt-in probabilistic view over perturbed weather members
+        try:
+            ensemble_members = int(data.get('ensemble_members') or 0)
+        except (TypeError, ValueError):
+            ensemble_members = -1
+        if ensemble_members < 0:
+            return jsonify({'error': 'ensemble_members must be a non-negative integer'}), 400
+        
+        # The ensemble is centred on the same forecast the schedule uses
+        weather_data = calculator.get_weather_data(data['location']) if ensemble_members else None
+        
         # Generate irrigation schedule
-        schedule = calculator.calculate_irrigation_schedule(data)
+        schedule = calculator.calculate_irrigation_schedule(data, weather_data=weather_data)
         summary = calculator.get_schedule_summary(schedule)
         
+        ensemble = None
+        if ensemble_members:
+            ensemble = calculator.calculate_schedule_ensemble(
+                data, members=min(ensemble_members, MAX_ENSEMBLE_MEMBERS), weather_data=weather_data
+            )
+        
         # Save report with complete user data
-        report_id = str(uuid.uuid4())
-        new_report = Report(
-            id=report_id,
-            phone_number=data.get('personal_info', {}).get('phone', 'unknown'),
-            report_data={
-                'schedule': schedule,
-                'summary': {
-                    **summary,
-                    'schedule': schedule,  # Include schedule in summary
-                    'user_data': {
-                        'crop_info': data.get('crop_info', {}),
-                        'soil_type': data.get('soil_type', ''),
-                        'location': data.get('location', {}),
-                        'farm_size': data.get('farm_size', {}),
-                        'personal_info': data.get('personal_info', {})
-                    }
-                }
-            },
-            created_at=datetime.utcnow(),
-            expires_at=datetime.utcnow() + timedelta(days=30)
-        )
+        new_report = build_report(data, schedule, summary)
         
         db.session.add(new_report)
         db.session.commit()
         
-        return jsonify({
+        response = {
             'success': True,
-            'report_id': report_id,
+            'report_id': new_report.id,
             'schedule': schedule,
             'summary': summary
-        })
+        }
+        if ensemble is not None:
+            response['ensemble'] = ensemble
+        
+        return jsonify(response)
         
     except Exception as e:
         print(f"Error in generate_schedule: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/season-simulation', methods=['POST'])
+def season_simulation():
+    try:
+        data = request.get_json() or {}
+        # Validate inputs before the response starts streaming
+        calculator.prepare_farm_params(data)
+        calculator.parse_planting_date(data)
+        farm_area = float(data['farm_size']['area'])
+    except Exception as e:
+        return jsonify({'error': f'Invalid farm data: {e}'}), 400
+    
+    def generate():
+        totals = {'total_days': 0, 'total_irrigation_days': 0, 'total_water_mm': 0.0,
+                  'total_water_liters': 0.0, 'forecast_days': 0}
+        try:
+            # One NDJSON line per day, then a summary line
+            for record in calculator.simulate_season(data):
+                totals['total_days'] += 1
+                totals['total_irrigation_days'] += int(record['irrigation_needed'])
+                totals['total_water_mm'] += record['irrigation_amount_mm']
+                totals['total_water_liters'] += record['total_water_liters']
+                totals['forecast_days'] += int(record['weather_source'] == 'forecast')
+                yield json.dumps({'type': 'day', **record}, cls=NpEncoder) + '\n'
+            
+            totals['total_water_mm'] = round(totals['total_water_mm'], 1)
+            totals['total_water_liters'] = round(totals['total_water_liters'], 0)
+            totals['farm_area'] = farm_area
+            yield json.dumps({'type': 'summary', **totals}, cls=NpEncoder) + '\n'
+        except Exception as e:
+            print(f"Error in season_simulation: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+MAX_OPTIMIZE_HORIZON_DAYS = int(os.getenv('MAX_OPTIMIZE_HORIZON_DAYS', 366))
+
+@app.route('/api/optimize-schedule', methods=['POST'])
+def optimize_schedule():
+    """Minimum water + pumping cost plan for one farm, or for {'farms': [...]}"""
+    try:
+        data = request.get_json() or {}
+        farms = data['farms'] if 'farms' in data else [data]
+        if not isinstance(farms, list) or not farms:
+            return jsonify({'error': 'farms must be a non-empty list'}), 400
+        if len(farms) > MAX_BATCH_FARMS:
+            return jsonify({'error': f'Too many farms. Max {MAX_BATCH_FARMS} per request.'}), 400
+        
+        horizon_days = data.get('horizon_days')
+        if horizon_days is not None:
+            horizon_days = int(horizon_days)
+            if not 1 <= horizon_days <= MAX_OPTIMIZE_HORIZON_DAYS:
+                return jsonify({'error': f'horizon_days must be between 1 and {MAX_OPTIMIZE_HORIZON_DAYS}'}), 400
+        
+        cost_options = {key: float(data[key]) for key in ('water_cost', 'pump_cost', 'min_event_mm') if key in data}
+        results = calculator.optimize_batch_plans(farms, horizon_days, **cost_options)
+        
+        if 'farms' not in data:
+            if 'error' in results[0]:
+                return jsonify(results[0]), 400
+            return jsonify({'success': True, **results[0]})
+        return jsonify({'success': True, 'results': results})
+        
+    except Exception as e:
+        print(f"Error in optimize_schedule: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+MAX_ZONES = int(os.getenv('MAX_ZONES', 5000))
+
+@app.route('/api/multi-zone-schedule', methods=['POST'])
+def multi_zone_schedule():
+    try:
+        data = request.get_json() or {}
+        zones = data.get('zones')
+        if not isinstance(zones, list) or not zones:
+            return jsonify({'error': 'zones must be a non-empty list'}), 400
+        if len(zones) > MAX_ZONES:
+            return jsonify({'error': f'Too many zones. Max {MAX_ZONES} per request.'}), 400
+        if not data.get('pump_flow_lph') or float(data['pump_flow_lph']) <= 0:
+            return jsonify({'error': 'pump_flow_lph must be a positive number'}), 400
+        
+        result = calculator.schedule_farm_zones(data)
+        return jsonify({'success': True, **result})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in multi_zone_schedule: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+MAX_VILLAGE_FARMS = int(os.getenv('MAX_VILLAGE_FARMS', 5000))
+
+@app.route('/api/village-allocation', methods=['POST'])
+def village_allocation():
+    try:
+        data = request.get_json() or {}
+        farms = data.get('farms')
+        if not isinstance(farms, list) or not farms:
+            return jsonify({'error': 'farms must be a non-empty list'}), 400
+        if len(farms) > MAX_VILLAGE_FARMS:
+            return jsonify({'error': f'Too many farms. Max {MAX_VILLAGE_FARMS} per request.'}), 400
+        if data.get('daily_capacity_liters') is None:
+            return jsonify({'error': 'daily_capacity_liters is required'}), 400
+        fairness = data.get('fairness', 'weighted')
+        if fairness not in ('weighted', 'equal'):
+            return jsonify({'error': "fairness must be 'weighted' or 'equal'"}), 400
+        
+        result = calculator.allocate_village_water(farms, data['daily_capacity_liters'], fairness)
+        return jsonify({'success': True, **result})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in village_allocation: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+MAX_SWEEP_COMBINATIONS = int(os.getenv('MAX_SWEEP_COMBINATIONS', 10000))
+
+@app.route('/api/what-if', methods=['POST'])
+def what_if():
+    """Sensitivity sweep over a parameter grid; nothing is saved"""
+    try:
+        data = request.get_json() or {}
+        grid = data.get('grid') or {}
+        crop_info = data.get('crop_info') or {}
+        farm_size = data.get('farm_size') or {}
+        
+        # Dimensions missing from the grid stay at the base farm's value
+        axes = {
+            'soil_types': grid.get('soil_types') or [data.get('soil_type')],
+            'crops': grid.get('crops') or [crop_info.get('name')],
+            'growth_stages': grid.get('growth_stages') or [crop_info.get('growth_stage', 2)],
+            'areas': grid.get('areas') or [farm_size.get('area', 1)],
+            'irrigation_methods': grid.get('irrigation_methods') or [farm_size.get('irrigation_method') or 'drip']
+        }
+        for name, values in axes.items():
+            if not isinstance(values, list) or any(value is None for value in values):
+                return jsonify({'error': f'{name} must be given in grid or on the base farm'}), 400
+        
+        combinations = 1
+        for values in axes.values():
+            combinations *= len(values)
+        if combinations > MAX_SWEEP_COMBINATIONS:
+            return jsonify({'error': f'Too many combinations ({combinations}). Max {MAX_SWEEP_COMBINATIONS}.'}), 400
+        if not data.get('location'):
+            return jsonify({'error': 'location is required'}), 400
+        
+        result = calculator.what_if_sweep(data['location'], **axes)
+        return jsonify({'success': True, 'combinations': combinations, **result})
+        
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid sweep parameters: {e}'}), 400
+    except Exception as e:
+        print(f"Error in what_if: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/refresh-schedule', methods=['POST'])
+def refresh_schedule():
+    try:
+        data = request.get_json() or {}
+        farm_id = data.get('farm_id')
+        if not farm_id:
+            return jsonify({'error': 'farm_id is required'}), 400
+        
+        # Resume from the saved soil-water state; only changed days are recomputed
+        state = db.session.get(FarmState, str(farm_id))
+        result = calculator.calculate_irrigation_schedule_incremental(
+            data, checkpoint=state.checkpoint if state else None
+        )
+        
+        if state:
+            state.checkpoint = result['checkpoint']
+        else:
+            db.session.add(FarmState(farm_id=str(farm_id), checkpoint=result['checkpoint']))
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'farm_id': farm_id,
+            'schedule': result['schedule'],
+            'summary': calculator.get_schedule_summary(result['schedule']),
+            'reused_days': result['reused_days'],
+            'recomputed_days': result['recomputed_days']
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in refresh_schedule: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Batch scheduling: many farms per request, one weather fetch per location
+MAX_BATCH_FARMS = int(os.getenv('MAX_BATCH_FARMS', 500))
+
+@app.route('/api/generate-schedule/batch', methods=['POST'])
+def generate_schedule_batch():
+    try:
+        data = request.get_json() or {}
+        farms = data.get('farms')
+        
+        if not isinstance(farms, list) or not farms:
+            return jsonify({'error': 'A non-empty list of farms is required'}), 400
+        if len(farms) > MAX_BATCH_FARMS:
+            return jsonify({'error': f'Too many farms. Max {MAX_BATCH_FARMS} per request.'}), 400
+        
+        results = calculator.calculate_batch_schedules(farms, include_ml=bool(data.get('include_ml', False)))
+        
+        # Save every successful report in a single transaction
+        response_items = []
+        new_reports = []
+        for index, (farm, result) in enumerate(zip(farms, results)):
+            if 'error' in result:
+                response_items.append({'index': index, 'success': False, 'error': result['error']})
+                continue
+            
+            new_report = build_report(farm, result['schedule'], result['summary'])
+            new_reports.append(new_report)
+            response_items.append({
+                'index': index,
+                'success': True,
+                'report_id': new_report.id,
+                'schedule': result['schedule'],
+                'summary': result['summary']
+            })
+        
+        db.session.add_all(new_reports)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'total_farms': len(farms),
+            'scheduled_farms': len(new_reports),
+            'results': response_items
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in generate_schedule_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 
 
 @app.route('/api/test-schedule', methods=['GET'])
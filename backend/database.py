@@ -1,5 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 from utils.json_encoder import NpEncoder
 
@@ -38,6 +38,17 @@ class RetentionSetting(db.Model):
     def __repr__(self):
         return f'<RetentionSetting {self.retention_days} days>'
 
+class FarmState(db.Model):
+    """Soil-water checkpoint used for incremental schedule refreshes"""
+    __tablename__ = 'farm_state'
+    
+    farm_id = db.Column(db.String(64), primary_key=True)
+    checkpoint = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FarmState {self.farm_id}>'
+
 def init_app(app):
     """Initialize database with Flask app"""
     db.init_app(app)
@@ -0,0 +1,253 @@
+"""
+Tree ensembles compiled into flat node arrays.
+
+A fitted sklearn forest (or single decision tree) is flattened into one
+set of contiguous arrays covering every node of every tree: split feature,
+threshold, left/right child and leaf value. When the forest was trained on
+StandardScaler output, the scaler is folded into the thresholds
+(x_scaled <= t  <=>  x <= t * scale + mean, adjusted for sklearn's float32
+comparison), so raw features go straight in.
+
+Leaves point back at themselves with an infinite threshold, so traversal is
+a fixed number of vectorized steps over (rows, trees) with no per-node
+Python work. Compiled models are saved as .npz next to the pickles, with
+the sha256 of the pickles they were built from so a stale file is noticed.
+"""
+import struct
+import zipfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def fold_thresholds(threshold, mean, scale):
+    """
+    Raw-unit thresholds T such that x <= T exactly when sklearn would send x
+    left: it compares float32((x - mean) / scale) <= threshold. A float32
+    value is <= threshold when it is <= a, the largest float32 not above
+    threshold, i.e. when the scaled value rounds down to a or below.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    a = threshold.astype(np.float32)
+    a = np.where(a.astype(np.float64) > threshold, np.nextafter(a, np.float32(-np.inf)), a)
+    b = np.nextafter(a, np.float32(np.inf))
+    midpoint = (a.astype(np.float64) + b.astype(np.float64)) / 2
+    # Round-half-to-even: the midpoint itself rounds to a only if a is even
+    a_is_even = (a.view(np.int32) & 1) == 0
+    scaled_limit = np.where(a_is_even, midpoint, np.nextafter(midpoint, -np.inf))
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Undo the scaling. The result can be off by a few ulps of the larger of
+    # scale * y and mean, so bracket it and bisect to the exact float64 boundary
+    folded = scaled_limit * scale + mean
+    slack = (np.abs(scaled_limit * scale) + np.abs(mean) + np.abs(folded)) * 1e-14 + 1e-300
+    low, high = folded - slack, folded + slack
+    for _ in range(64):
+        widen_low, widen_high = ~goes_left(low), goes_left(high)
+        if not (widen_low.any() or widen_high.any()):
+            break
+        slack = np.where(widen_low | widen_high, slack * 2, slack)
+        low = np.where(widen_low, folded - slack, low)
+        high = np.where(widen_high, folded + slack, high)
+
+    for _ in range(128):
+        middle = low / 2 + high / 2
+        active = (middle > low) & (middle < high)
+        if not active.any():
+            break
+        left = goes_left(middle)
+        low = np.where(active & left, middle, low)
+        high = np.where(active & ~left, middle, high)
+    return low
+
+
+def memmap_npz(path):
+    """
+    Read-only memory maps of the arrays in an uncompressed .npz (np.savez),
+    so processes loading the same file share its pages.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+            # Member data follows its local header: 30 bytes, then name and extra field
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            start = f.tell()
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if shape == () or 0 in shape:
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f, allow_pickle=False)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(),
+                                         shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 n_features, classes=None, source_sha256=None):
+        self.feature = feature        # (nodes,) int32
+        self.threshold = threshold    # (nodes,) float64, in raw feature units
+        self.left = left              # (nodes,) int32, global node index
+        self.right = right            # (nodes,) int32
+        self.value = value            # (nodes, outputs) float64
+        self.roots = roots            # (trees,) int32
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes = classes        # class labels for classifiers, else None
+        self.source_sha256 = source_sha256  # digest of the source pickles, if recorded
+
+    @property
+    def is_classifier(self):
+        return self.classes is not None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        arrays = (self.feature, self.threshold, self.left, self.right, self.value, self.roots)
+        return sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """Compile a fitted forest or decision tree, folding in an optional StandardScaler"""
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None:
+            estimators = [model]
+        if not all(hasattr(estimator, 'tree_') for estimator in estimators):
+            raise ValueError(f"{type(model).__name__} is not a forest of decision trees")
+
+        n_features = int(model.n_features_in_)
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+        if scaler is not None:
+            if getattr(scaler, 'mean_', None) is not None:
+                mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if getattr(scaler, 'scale_', None) is not None:
+                scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        classes = getattr(model, 'classes_', None)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            nodes = tree.node_count
+            is_leaf = tree.children_left < 0
+            node_index = np.arange(nodes) + offset
+
+            feature = np.where(is_leaf, 0, tree.feature)
+            threshold = np.full(nodes, np.inf)
+            threshold[~is_leaf] = fold_thresholds(
+                tree.threshold[~is_leaf], mean[feature[~is_leaf]], scale[feature[~is_leaf]]
+            )
+            value = tree.value[:, 0, :] if classes is None else tree.value[:, 0, :len(classes)]
+            if classes is not None:
+                # Older sklearn stores class counts; the forest averages per-tree fractions
+                totals = value.sum(axis=1, keepdims=True)
+                value = value / np.where(totals > 0, totals, 1)
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(np.where(is_leaf, node_index, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_index, tree.children_right + offset))
+            values.append(value)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += nodes
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=n_features,
+            classes=None if classes is None else np.asarray(classes)
+        )
+
+    def apply(self, X):
+        """(rows, trees) leaf indices for raw (unscaled) features"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise ValueError('predict_proba needs a compiled classifier')
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        if self.is_classifier:
+            return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+        return self.value[self.apply(X)].mean(axis=1)[:, 0]
+
+    def save(self, path):
+        arrays = {
+            'format_version': np.array(FORMAT_VERSION),
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'roots': self.roots,
+            'max_depth': np.array(self.max_depth),
+            'n_features': np.array(self.n_features)
+        }
+        if self.is_classifier:
+            arrays['classes'] = self.classes
+        if self.source_sha256:
+            arrays['source_sha256'] = np.array(self.source_sha256)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Load a saved forest; with mmap the node arrays stay memory-mapped read-only"""
+        if mmap:
+            return cls.from_arrays(memmap_npz(path), path)
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays({name: data[name] for name in data.files}, path)
+
+    @classmethod
+    def from_arrays(cls, data, path):
+        if int(data['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format in {path}")
+        return cls(
+            feature=data['feature'],
+            threshold=data['threshold'],
+            left=data['left'],
+            right=data['right'],
+            value=data['value'],
+            roots=data['roots'],
+            max_depth=int(data['max_depth']),
+            n_features=int(data['n_features']),
+            classes=data.get('classes'),
+            source_sha256=str(data['source_sha256']) if 'source_sha256' in data else None
+        )
@@ -273,4 +273,10 @@ IRRIGATION_TRIGGERS = {  # mm depletion thresholds
     "Sandy Loam": 45,
     "Loam": 20,
     "Clay": 15
-}
\ No newline at end of file
+}
+IRRIGATION_EFFICIENCY = {  # fraction of applied water reaching the root zone
+    "drip": 0.9,
+    "sprinkler": 0.75,
+    "furrow": 0.65,
+    "flood": 0.6
+}
@@ -0,0 +1,125 @@
+import numpy as np
+
+from utils.weather_api import HOURLY_COLUMNS, decode_hourly
+
+# Psychrometric constant (kPa/°C), simplified for sea level
+GAMMA = 0.665
+
+# Realistic daily ET0 bounds (mm/day)
+ET0_MIN = 2.0
+ET0_MAX = 15.0
+
+
+def weather_to_arrays(weather_data):
+    """Convert a list of day dicts into float64 column arrays"""
+    return {
+        'temp_max': np.array([day['temp_max'] for day in weather_data], dtype=np.float64),
+        'temp_min': np.array([day['temp_min'] for day in weather_data], dtype=np.float64),
+        'humidity': np.array([day['humidity'] for day in weather_data], dtype=np.float64),
+        'wind_speed': np.array([day['wind_speed'] for day in weather_data], dtype=np.float64),
+        'solar_radiation': np.array([day.get('solar_radiation', 25) for day in weather_data], dtype=np.float64),
+    }
+
+
+def penman_monteith_et0(temp_max, temp_min, humidity, wind_speed, solar_radiation):
+    """
+    Vectorized FAO-56 Penman-Monteith ET0 (mm/day)
+    Inputs are broadcastable arrays of any shape, e.g. (days,) or (days, farms).
+    Gives the same values as the per-day loop in IrrigationCalculator.
+    """
+    temp_max = np.asarray(temp_max, dtype=np.float64)
+    temp_min = np.asarray(temp_min, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    wind_speed = np.asarray(wind_speed, dtype=np.float64)
+    solar_radiation = np.asarray(solar_radiation, dtype=np.float64)
+
+    temp_mean = (temp_max + temp_min) / 2
+
+    # Saturation vapor pressure (kPa)
+    es = 0.6108 * np.exp(17.27 * temp_mean / (temp_mean + 237.3))
+
+    # Actual vapor pressure (kPa)
+    ea = es * humidity / 100
+
+    # Slope of saturation vapor pressure curve (kPa/°C)
+    delta = 4098 * es / (temp_mean + 237.3)**2
+
+    numerator = (0.408 * delta * solar_radiation +
+                 GAMMA * 900 / (temp_mean + 273) * wind_speed * (es - ea))
+    denominator = delta + GAMMA * (1 + 0.34 * wind_speed)
+
+    return np.clip(numerator / denominator, ET0_MIN, ET0_MAX)
+
+
+def hourly_to_arrays(weather_data):
+    """
+    Unpack each day's compact 'hourly' block into (days, 24) float32 arrays,
+    plus a (days,) boolean mask of the days that carry all 24 hours. Rows of
+    days without hourly data are zero and must be ignored by the caller.
+    """
+    blocks = [decode_hourly(day.get('hourly')) for day in weather_data]
+    mask = np.array([block is not None for block in blocks], dtype=bool)
+    stacked = np.zeros((len(weather_data), len(HOURLY_COLUMNS), 24), dtype=np.float32)
+    for day, block in enumerate(blocks):
+        if block is not None:
+            stacked[day] = block
+    arrays = {name: stacked[:, column] for column, name in enumerate(HOURLY_COLUMNS)}
+    return arrays, mask
+
+
+def hourly_solar_radiation(daily_solar_radiation, cloud):
+    """
+    Spread daily radiation (MJ/m²/day) over the hours, (days, 24) float32.
+    Daylight follows a 06:00-18:00 sine profile thinned by cloud cover and
+    each day's hours add back up to the daily total.
+    """
+    hours = np.arange(24, dtype=np.float32) + 0.5
+    profile = np.maximum(0, np.sin(np.pi * (hours - 6) / 12)).astype(np.float32)
+    weight = profile[None, :] * (1 - 0.5 * cloud / 100)
+    total = weight.sum(axis=1, keepdims=True)
+    total[total == 0] = 1
+    return (np.asarray(daily_solar_radiation, dtype=np.float32)[:, None] * weight / total).astype(np.float32)
+
+
+def penman_monteith_et0_hourly(temp, humidity, wind_speed, solar_radiation):
+    """
+    Vectorized FAO-56 hourly Penman-Monteith ET0 (mm/hour), eq. 53.
+    Inputs are (days, 24) arrays; computed in float32. Radiation is treated
+    as net radiation, as in the daily form, with soil heat flux 10% of it
+    in daylight and 50% at night.
+    """
+    temp = np.asarray(temp, dtype=np.float32)
+    humidity = np.asarray(humidity, dtype=np.float32)
+    wind_speed = np.asarray(wind_speed, dtype=np.float32)
+    rn = np.asarray(solar_radiation, dtype=np.float32)
+
+    es = 0.6108 * np.exp(17.27 * temp / (temp + 237.3))
+    ea = es * humidity / 100
+    delta = 4098 * es / (temp + 237.3)**2
+    soil_heat = np.where(rn > 0, 0.1, 0.5).astype(np.float32) * rn
+
+    numerator = (0.408 * delta * (rn - soil_heat) +
+                 GAMMA * 37 / (temp + 273) * wind_speed * (es - ea))
+    denominator = delta + GAMMA * (1 + 0.34 * wind_speed)
+
+    return np.maximum(numerator / denominator, 0).astype(np.float32)
+
+
+def best_windows(hourly_loss, durations, earliest_hour=0, latest_hour=24):
+    """
+    Start hour of the consecutive block with the least summed loss per day.
+    hourly_loss is (days, 24), durations are whole hours per day. Blocks
+    must fit between earliest_hour and latest_hour; rolling sums come from
+    one cumulative sum per day.
+    """
+    span = latest_hour - earliest_hour
+    loss = hourly_loss[:, earliest_hour:latest_hour].astype(np.float64)
+    cumulative = np.concatenate([np.zeros((loss.shape[0], 1)), np.cumsum(loss, axis=1)], axis=1)
+    durations = np.clip(np.asarray(durations, dtype=np.intp), 1, span)
+
+    starts = np.empty(len(durations), dtype=np.intp)
+    for length in np.unique(durations):
+        days = np.flatnonzero(durations == length)
+        window_loss = cumulative[days, length:] - cumulative[days, :span - length + 1]
+        starts[days] = np.argmin(window_loss, axis=1) + earliest_hour
+    return starts, durations
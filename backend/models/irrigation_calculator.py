@@ -2,47 +2,218 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import requests
-from models.data_models import SOIL_TYPES, CROP_DATABASE, SOIL_THRESHOLDS, IRRIGATION_TRIGGERS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from models.data_models import IRRIGATION_EFFICIENCY
+from models.parameter_store import get_parameter_store
+from models.et_engine import (penman_monteith_et0, weather_to_arrays, hourly_to_arrays,
+                               hourly_solar_radiation, penman_monteith_et0_hourly, best_windows)
+from models.water_balance import simulate_water_balance
+from models.irrigation_optimizer import optimize_irrigation
+from models.zone_scheduler import schedule_zones, format_minutes, DEFAULT_WINDOWS
+from models.water_allocation import allocate_water
+from models.weather_ensemble import run_ensemble, DEFAULT_MEMBERS, PERCENTILES
+from models import ml_predictor
+from utils.weather_cache import WeatherCache
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.single_flight import SingleFlight
+from utils.async_weather import fetch_weather_for_locations
+from utils.weather_api import compact_hourly
+from utils.ttl_cache import TTLCache
+from collections import deque
+import copy
+import hashlib
+import json
+import threading
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+DEFAULT_IRRIGATION_WINDOW = "06:00-08:00"
+# Hours of the day irrigation may be scheduled in
+IRRIGATION_EARLIEST_HOUR = int(os.getenv('IRRIGATION_EARLIEST_HOUR', 5))
+IRRIGATION_LATEST_HOUR = int(os.getenv('IRRIGATION_LATEST_HOUR', 21))
+
+def build_http_session(pool_size=None, retries=None):
+    """Keep-alive session with a bounded connection pool and retry/backoff"""
+    pool_size = int(pool_size if pool_size is not None else os.getenv('WEATHER_API_POOL_SIZE', 10))
+    retries = int(retries if retries is not None else os.getenv('WEATHER_API_RETRIES', 2))
+
+    # Retry connection failures and 5xx answers only; a slow read is not retried
+    # so one outage can't multiply the time a worker spends waiting. An
+    # upstream Retry-After is ignored for the same reason: backoff stays ours.
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 class WeatherAPIClient:
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache=None):
         if not api_key or len(api_key) < 20:
             raise ValueError("Invalid WeatherAPI key provided")
         self.api_key = api_key
-        self.base_url = "http://api.weatherapi.com/v1"
+        # WEATHER_API_BASE_URL points the client at a stand-in server for offline tests
+        self.base_url = os.getenv('WEATHER_API_BASE_URL', "http://api.weatherapi.com/v1").rstrip('/')
+        self.cache = cache
+        self.inflight = SingleFlight()
+        self.session = build_http_session()
+        # For deadline-bound callers: a retry would run past their deadline
+        self.single_try_session = build_http_session(retries=0)
+        self.timeout = (
+            float(os.getenv('WEATHER_API_CONNECT_TIMEOUT', 3)),
+            float(os.getenv('WEATHER_API_READ_TIMEOUT', 6))
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('WEATHER_BREAKER_FAILURES', 3)),
+            recovery_timeout=float(os.getenv('WEATHER_BREAKER_RECOVERY', 60))
+        )
+        self._stats_lock = threading.Lock()
+        self.latencies_ms = deque(maxlen=500)
+        self.upstream_calls = 0
+        self.upstream_failures = 0
     
-    def get_weather_data(self, location, days=7):
-        """Fetch weather data for irrigation scheduling"""
+    def get_weather_data(self, location, days=7, key_location=None):
+        """Fetch weather data for irrigation scheduling; key_location (default: location) keys the cache"""
+        location_str = self.clean_location_parameter(location)
+        request_key = self.make_request_key(self.clean_location_parameter(key_location or location), days)
+
+        if self.cache:
+            cached = self.cache.get(request_key)
+            if cached is not None:
+                return cached
+
         try:
-            forecast_url = f"{self.base_url}/forecast.json"
-            location_str = self.clean_location_parameter(location)
-            
-            params = {
-                'key': self.api_key,
-                'q': location_str,
-                'days': min(days, 7),
-                'aqi': 'no',
-                'alerts': 'no'
-            }
+            # Concurrent lookups for the same key share one upstream fetch
+            weather_data = self.inflight.do(
+                request_key, lambda: self.fetch_and_cache(request_key, location_str, days)
+            )
+            return copy.deepcopy(weather_data)
             
-            print(f"Requesting weather for: {location_str}")
-            response = requests.get(forecast_url, params=params, timeout=15)
+        except Exception as e:
+            print(f"Weather API error: {e}")
+            return self.get_fallback_weather_data(days, location)
+
+    def make_request_key(self, location_str, days):
+        """Normalized key shared by the cache and in-flight coalescing"""
+        if self.cache:
+            return self.cache.make_key(location_str, days)
+        return f"{' '.join(location_str.lower().split())}|{days}"
+
+    def refresh_cache(self, location, days=7, key_location=None):
+        """Fetch fresh data for a location and overwrite its cache entry (raises on failure)"""
+        location_str = self.clean_location_parameter(location)
+        request_key = self.make_request_key(self.clean_location_parameter(key_location or location), days)
+        return self.inflight.do(
+            request_key, lambda: self.fetch_and_cache(request_key, location_str, days, refresh=True)
+        )
+
+    def fetch_and_cache(self, request_key, location_str, days, refresh=False, timeout=None, session=None):
+        """Fetch from the API and store the result; runs once per in-flight key"""
+        # Another caller may have filled the cache just before we took the lead;
+        # the caller already counted this lookup as a miss
+        if self.cache and not refresh:
+            cached = self.cache.get(request_key, count=False)
+            if cached is not None:
+                return cached
+
+        weather_data = self.fetch_weather_data(location_str, days, timeout=timeout, session=session)
+        if self.cache:
+            self.cache.set(request_key, weather_data)
+        return weather_data
+
+    def fetch_weather_data(self, location_str, days=7, timeout=None, session=None):
+        """Call WeatherAPI forecast.json for a cleaned location string"""
+        # Skip the network entirely while the provider is known to be down
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Weather API circuit open, using fallback data")
+
+        forecast_url = f"{self.base_url}/forecast.json"
+        
+        params = {
+            'key': self.api_key,
+            'q': location_str,
+            'days': min(days, 7),
+            'aqi': 'no',
+            'alerts': 'no'
+        }
+        
+        print(f"Requesting weather for: {location_str}")
+        started = time.perf_counter()
+        try:
+            response = (session or self.session).get(forecast_url, params=params, timeout=timeout or self.timeout)
             
             if response.status_code == 400:
                 print(f"Bad request - check location format: {location_str}")
             
             response.raise_for_status()
             data = response.json()
-            
-            return self.process_weather_data(data)
-            
-        except Exception as e:
-            print(f"Weather API error: {e}")
-            return self.get_fallback_weather_data(days, location)
+        except requests.HTTPError as e:
+            # 4xx means the provider is up and rejected this query
+            if e.response is not None and 400 <= e.response.status_code < 500:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            self.record_call(started, failed=True)
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            self.record_call(started, failed=True)
+            raise
+
+        self.breaker.record_success()
+        self.record_call(started)
+        
+        return self.process_weather_data(data)
+
+    def record_call(self, started, failed=False):
+        """Track per-call upstream latency"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.latencies_ms.append(elapsed_ms)
+            self.upstream_calls += 1
+            if failed:
+                self.upstream_failures += 1
+
+    def stats(self):
+        """Breaker state and recent upstream latency"""
+        with self._stats_lock:
+            latencies = np.array(self.latencies_ms) if self.latencies_ms else None
+            calls = self.upstream_calls
+            failures = self.upstream_failures
+
+        latency = None
+        if latencies is not None:
+            latency = {
+                'last_ms': round(float(latencies[-1]), 1),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+                'max_ms': round(float(latencies.max()), 1),
+                'samples': int(latencies.size)
+            }
+
+        return {
+            'base_url': self.base_url,
+            'upstream_calls': calls,
+            'upstream_failures': failures,
+            'latency': latency,
+            'circuit_breaker': self.breaker.stats(),
+            'coalescing': self.inflight.stats()
+        }
     
     def clean_location_parameter(self, location):
         """Clean and format location parameter for API"""
@@ -83,6 +254,10 @@ class WeatherAPIClient:
                 'weather_condition': day['condition']['text']
             }
             
+            hourly = compact_hourly(day_data.get('hour', []))
+            if hourly:
+                processed_day['hourly'] = hourly
+            
             weather_data.append(processed_day)
         
         return weather_data
@@ -92,12 +267,7 @@ class WeatherAPIClient:
         weather_data = []
         base_date = datetime.now()
         
-        if location and self.is_coastal_region(location):
-            temp_max_base, temp_min_base, humidity_base, rainfall_base = 32, 24, 75, 3
-        elif location and self.is_arid_region(location):
-            temp_max_base, temp_min_base, humidity_base, rainfall_base = 38, 22, 35, 0.5
-        else:
-            temp_max_base, temp_min_base, humidity_base, rainfall_base = 35, 25, 55, 1
+        temp_max_base, temp_min_base, humidity_base, rainfall_base = self.get_region_baseline(location)
         
         for i in range(days):
             date = base_date + timedelta(days=i)
@@ -115,6 +285,42 @@ class WeatherAPIClient:
         
         return weather_data
     
+    def get_region_baseline(self, location=None):
+        """Regional normals: (temp_max, temp_min, humidity, rainfall)"""
+        if location and self.is_coastal_region(location):
+            return 32, 24, 75, 3
+        elif location and self.is_arid_region(location):
+            return 38, 22, 35, 0.5
+        return 35, 25, 55, 1
+
+    def get_climatology_weather(self, dates, location=None):
+        """
+        Deterministic long-range weather for days beyond the forecast:
+        the fallback means for the region plus a seasonal temperature cycle
+        peaking in mid-May.
+        """
+        temp_max_base, temp_min_base, humidity_base, rainfall_base = self.get_region_baseline(location)
+        weather_data = []
+        
+        for date in dates:
+            day_of_year = date.timetuple().tm_yday
+            season_factor = np.sin(2 * np.pi * (day_of_year - 44) / 365)
+            temp_max = max(20, temp_max_base + 3 * season_factor)
+            temp_min = max(15, temp_min_base + 3 * season_factor)
+            weather_data.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'temp_max': float(temp_max),
+                'temp_min': float(temp_min),
+                'temp_avg': float((temp_max + temp_min) / 2),
+                'humidity': float(humidity_base),
+                'wind_speed': 6.0,
+                'rainfall': float(rainfall_base + 1),  # fallback adds Exp(1) rain
+                'solar_radiation': 22.0,
+                'weather_condition': 'Climatology'
+            })
+        
+        return weather_data
+    
     def is_coastal_region(self, location):
         """Check if location is in coastal region"""
         if isinstance(location, dict):
@@ -150,8 +356,14 @@ class IrrigationCalculator:
         self.weather_api_key = os.getenv("WEATHER_API_KEY")
         if not self.weather_api_key:
             raise ValueError("WEATHER_API_KEY not found in environment variables.")
-        self.weather_client = WeatherAPIClient(self.weather_api_key)
+        self.weather_client = WeatherAPIClient(self.weather_api_key, cache=WeatherCache())
         self.ml_predictor = IrrigationMLPredictor()
+        # Trained forest models, loaded on the first batch that asks for them
+        self.forest_predictor = None
+        self.forest_predictor_lock = threading.Lock()
+        self.parameters = get_parameter_store()
+        # Finished schedules keyed on a fingerprint of (forecast, farm inputs)
+        self.schedule_cache = TTLCache(max_entries=int(os.getenv('SCHEDULE_CACHE_MAX_ENTRIES', 5000)))
     
     def extract_numeric_value(self, value, default=0):
         """Helper function to extract numeric values from potentially nested data"""
@@ -162,68 +374,46 @@ class IrrigationCalculator:
         else:
             return default
     
-    def get_weather_data(self, location):
-        """Fetch weather data using WeatherAPI"""
+    def resolve_location_query(self, location):
+        """Turn a request location into the query string sent to WeatherAPI"""
         if isinstance(location, dict):
             if location.get('address'):
-                location_query = location['address']
+                return location['address']
             elif location.get('latitude') and location.get('longitude'):
-                location_query = f"{location['latitude']},{location['longitude']}"
+                return f"{location['latitude']},{location['longitude']}"
             else:
-                location_query = "Phalodi"
-        else:
-            location_query = str(location)
-        
-        return self.weather_client.get_weather_data(location_query, days=7)
+                return "Phalodi"
+        return str(location)
+
+    def resolve_cache_location(self, location):
+        """Location the weather cache is keyed on: the coordinates whenever the request has them"""
+        if isinstance(location, dict) and location.get('latitude') and location.get('longitude'):
+            return f"{location['latitude']},{location['longitude']}"
+        return self.resolve_location_query(location)
+
+    def get_weather_data(self, location):
+        """Fetch weather data using WeatherAPI"""
+        return self.weather_client.get_weather_data(self.resolve_location_query(location), days=7,
+                                                    key_location=self.resolve_cache_location(location))
     
     def calculate_et0_penman_monteith(self, weather_data):
         """Corrected FAO-56 Penman-Monteith equation"""
-        et0_values = []
-        
-        for day in weather_data:
-            temp_mean = (day['temp_max'] + day['temp_min']) / 2
-            temp_max = day['temp_max']
-            temp_min = day['temp_min']
-            RH_mean = day['humidity']
-            wind_speed = day['wind_speed']
-            solar_rad = day.get('solar_radiation', 25)  # MJ/m²/day
-            
-            # Saturation vapor pressure (kPa)
-            es = 0.6108 * np.exp(17.27 * temp_mean / (temp_mean + 237.3))
-            
-            # Actual vapor pressure (kPa)
-            ea = es * RH_mean / 100
-            
-            # Slope of saturation vapor pressure curve (kPa/°C)
-            delta = 4098 * es / (temp_mean + 237.3)**2
-            
-            # Psychrometric constant (kPa/°C)
-            gamma = 0.665  # Simplified for sea level
-            
-            # FAO-56 Penman-Monteith equation (mm/day)
-            numerator = (0.408 * delta * solar_rad + 
-                        gamma * 900 / (temp_mean + 273) * wind_speed * (es - ea))
-            denominator = delta + gamma * (1 + 0.34 * wind_speed)
-            
-            et0 = numerator / denominator
-            et0_values.append(max(2.0, min(15.0, et0)))  # Realistic bounds
-        
-        return et0_values
+        if not weather_data:
+            return []
+
+        # One vectorized pass over the whole forecast instead of a per-day loop
+        arrays = weather_to_arrays(weather_data)
+        return penman_monteith_et0(**arrays).tolist()
+
+    def calculate_et0_arrays(self, temp_max, temp_min, humidity, wind_speed, solar_radiation):
+        """Columnar ET0 for arrays shaped (days, farms) or any broadcastable shape"""
+        return penman_monteith_et0(temp_max, temp_min, humidity, wind_speed, solar_radiation)
 
     def calculate_crop_et(self, et0_values, crop_info, growth_stage):
         """Calculate crop evapotranspiration"""
         try:
-            crop_data = CROP_DATABASE[crop_info['name']]
-            
             # Determine Kc based on growth stage
-            stage_mapping = {
-                0: crop_data['kc_initial'],
-                1: crop_data['kc_development'], 
-                2: crop_data['kc_mid'],
-                3: crop_data['kc_late']
-            }
-            
-            kc = stage_mapping.get(growth_stage, crop_data['kc_mid'])
+            kc = float(self.parameters.stage_kc(self.parameters.crop_code(crop_info['name']), growth_stage))
             
             # Calculate ETc for each day
             etc_values = [et0 * kc for et0 in et0_values]
@@ -231,152 +421,154 @@ class IrrigationCalculator:
         except:
             # Fallback calculation
             return [et0 * 1.1 for et0 in et0_values]
+
+    def prepare_farm_params(self, user_data):
+        """Resolve soil/crop lookups for one farm payload into plain numbers"""
+        soil_type = user_data['soil_type']
+        crop_info = user_data['crop_info']
+        crop_name = crop_info['name']
+        farm_size = user_data['farm_size']
+
+        # Integer codes into the precompiled parameter arrays;
+        # AWC (mm) comes from the soil x crop matrix validated at startup
+        store = self.parameters
+        soil_code = store.soil_code(soil_type)
+        crop_code = store.crop_code(crop_name)
+
+        return {
+            'location': user_data['location'],
+            'soil_type': soil_type,
+            'crop_name': crop_name,
+            'soil_code': soil_code,
+            'crop_code': crop_code,
+            'growth_stage': crop_info['growth_stage'],
+            'kc': float(store.stage_kc(crop_code, crop_info['growth_stage'])),
+            'field_capacity': float(store.field_capacity[soil_code]),
+            'wilting_point': float(store.wilting_point[soil_code]),
+            'rooting_depth': float(store.rooting_depth[crop_code]),
+            'awc': float(store.awc[soil_code, crop_code]),
+            'irrigation_threshold_percent': float(store.soil_threshold[soil_code] * store.stress_factor[crop_code]),
+            'irrigation_threshold_mm': float(store.irrigation_trigger[soil_code]),
+            'farm_area': float(farm_size['area']),
+            'irrigation_method': farm_size.get('irrigation_method')
+        }
+
+    def best_irrigation_times(self, weather_data, durations):
+        """
+        Lowest-evaporation window per day from hourly ET0, sized to the pump
+        run time (whole hours). Days without hourly data keep the default.
+        """
+        hourly, has_hours = hourly_to_arrays(weather_data)
+        best_times = [DEFAULT_IRRIGATION_WINDOW] * len(weather_data)
+        if not has_hours.any():
+            return best_times
+
+        days = np.flatnonzero(has_hours)
+        solar = hourly_solar_radiation(weather_to_arrays(weather_data)['solar_radiation'][days],
+                                       hourly['cloud'][days])
+        et0_hourly = penman_monteith_et0_hourly(hourly['temp'][days], hourly['humidity'][days],
+                                                hourly['wind_speed'][days], solar)
+        starts, lengths = best_windows(et0_hourly, np.asarray(durations)[days],
+                                       IRRIGATION_EARLIEST_HOUR, IRRIGATION_LATEST_HOUR)
+        for day, start, length in zip(days, starts, lengths):
+            best_times[day] = f"{start:02d}:00-{start + length:02d}:00"
+        return best_times
+
+    def build_schedule(self, weather_data, et0_values, etc_values, balance, farm_area):
+        """Turn one farm's water-balance columns into schedule day records"""
+        schedule = []
+        # Pump run time in whole hours; dry days get the default two-hour window
+        run_hours = np.where(balance['irrigation_amount'] > 0,
+                             np.ceil(np.asarray(balance['irrigation_amount']) / 10), 2)
+        best_times = self.best_irrigation_times(weather_data, run_hours)
+
+        for i, weather in enumerate(weather_data):
+            date = weather['date']
+            rainfall = self.extract_numeric_value(weather.get('rainfall', 0))
+
+            soil_moisture = float(balance['soil_moisture'][i])
+            soil_moisture_percent = float(balance['soil_moisture_percent'][i])
+            depletion_percent = float(balance['depletion_percent'][i])
+            irrigation_needed = bool(balance['irrigation_needed'][i])
+            irrigation_amount = float(balance['irrigation_amount'][i])
+
+            # Calculate duration and water volume
+            irrigation_duration = irrigation_amount / 10 if irrigation_amount > 0 else 0
+            total_water_liters = irrigation_amount * farm_area * 10 if irrigation_amount > 0 else 0
+
+            # Generate proper recommendations
+            recommendation = self.get_recommendation_fixed(
+                irrigation_needed, depletion_percent, rainfall
+            )
+
+            schedule.append({
+                'date': date,
+                'day_name': datetime.strptime(date, '%Y-%m-%d').strftime('%A'),
+                'weather': {
+                    'temp_max': round(float(weather['temp_max']), 1),
+                    'temp_min': round(float(weather['temp_min']), 1),
+                    'humidity': round(float(weather.get('humidity', 30)), 1),
+                    'rainfall': round(rainfall, 1),
+                    'wind_speed': round(float(weather.get('wind_speed', 5)), 1)
+                },
+                'et0': round(float(et0_values[i]), 2),
+                'etc': round(float(etc_values[i]), 2),
+                'soil_moisture_mm': round(soil_moisture, 1),
+                'soil_moisture_percent': round(soil_moisture_percent, 1),
+                'irrigation_needed': irrigation_needed,
+                'irrigation_amount_mm': round(irrigation_amount, 1),
+                'irrigation_duration_hours': round(irrigation_duration, 1),
+                'best_irrigation_time': best_times[i],
+                'total_water_liters': round(total_water_liters, 0),
+                'recommendation': recommendation,
+                'ml_confidence': 75.0,
+                'prediction_method': 'fao56_method'
+            })
+
+        return schedule
+
+    def rainfall_array(self, weather_data):
+        """Daily rainfall column (mm) for the water balance"""
+        return np.array([self.extract_numeric_value(day.get('rainfall', 0)) for day in weather_data],
+                        dtype=np.float64)
     
-    def calculate_irrigation_schedule(self, user_data):
-        """Generate complete irrigation schedule with FIXED logic"""
+    def calculate_irrigation_schedule(self, user_data, weather_data=None):
+        """Generate complete irrigation schedule with FIXED logic; weather_data skips the fetch"""
         try:
-            # Extract data
-            location = user_data['location']
-            soil_type = user_data['soil_type']
-            crop_info = user_data['crop_info']
-            crop_name = crop_info['name']
-            farm_size = user_data['farm_size']
+            params = self.prepare_farm_params(user_data)
             
-            print(f"Processing schedule for: {crop_name} in {soil_type} soil")
+            print(f"Processing schedule for: {params['crop_name']} in {params['soil_type']} soil")
             
             # Get weather data
-            weather_data = self.get_weather_data(location)
+            if weather_data is None:
+                weather_data = self.get_weather_data(params['location'])
+
+            # Identical inputs on the same forecast reuse the earlier result
+            cache_key = self.schedule_cache_key(params, self.weather_digest(weather_data))
+            cached = self.schedule_cache.get(cache_key)
+            if cached is not None:
+                print("Schedule cache hit")
+                return copy.deepcopy(cached)
             
             # Calculate ET0
             et0_values = self.calculate_et0_penman_monteith(weather_data)
             
             # Calculate crop ET
-            etc_values = self.calculate_crop_et(et0_values, crop_info, crop_info['growth_stage'])
-            
-            # Get soil properties
-            soil_props = SOIL_TYPES[soil_type]
-            crop_props = CROP_DATABASE[crop_info['name']]
-            
-            # Calculate available water capacity
-            field_capacity = float(soil_props['field_capacity'])
-            wilting_point = float(soil_props['wilting_point'])
-            rooting_depth = float(crop_props['rooting_depth'])
-            
-            awc = (field_capacity - wilting_point) * rooting_depth * 1000  # mm
-            # Add validation
-            if awc <= 0:
-                raise ValueError(f"""
-                Invalid AWC calculation for:
-                - Soil: {soil_type}
-                - Field Capacity: {field_capacity}
-                - Wilting Point: {wilting_point}
-                - Root Depth: {rooting_depth}m
-                AWC must be >0, got {awc}mm
-                """)
-            
-            # FIXED: Proper irrigation thresholds for arid conditions
-            crop_adjustment = CROP_DATABASE[crop_name].get('stress_factor', 1.0)
-            irrigation_threshold_percent = SOIL_THRESHOLDS[soil_type] * crop_adjustment
-            irrigation_threshold_mm = IRRIGATION_TRIGGERS[soil_type]
+            etc_values = self.calculate_crop_et(et0_values, user_data['crop_info'], params['growth_stage'])
             
             print(f"""
                 === AWC Calculation ===
-                Soil Type: {soil_type}
-                Field Capacity: {field_capacity} m³/m³
-                Wilting Point: {wilting_point} m³/m³
-                Root Depth: {rooting_depth}m
-                AWC: {awc}mm
-                Irrigation Threshold: {irrigation_threshold_mm}mm
+                Soil Type: {params['soil_type']}
+                Field Capacity: {params['field_capacity']} m³/m³
+                Wilting Point: {params['wilting_point']} m³/m³
+                Root Depth: {params['rooting_depth']}m
+                AWC: {params['awc']}mm
+                Irrigation Threshold: {params['irrigation_threshold_mm']}mm
                 """)
 
-            
-            schedule = []
-            soil_moisture = awc * 0.5  # Start at 80%
-            days_since_irrigation = 0
-            # Use proper MAD threshold (from search results)
-            MAD_RICE_DRIP = 50  # 30% for drip irrigation system  # Management Allowable Depletion
-            
-            for i, (weather, etc) in enumerate(zip(weather_data, etc_values)):
-                date = weather['date']
-                day_of_year = datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday
-                
-                # Update soil moisture
-                rainfall = self.extract_numeric_value(weather.get('rainfall', 0))
-                soil_moisture += rainfall
-                soil_moisture -= etc
-                soil_moisture = max(0, min(soil_moisture, awc))
-                
-                # CORRECT depletion calculation (from search results)
-                soil_moisture_percent = (soil_moisture / awc) * 100
-                depletion_percent = 100 - soil_moisture_percent
-    
-                irrigation_needed = depletion_percent > MAD_RICE_DRIP
-
-                # Only irrigate when truly needed
-                irrigation_amount = 0
-                if irrigation_needed:
-                    target_moisture = awc * 0.8
-                    irrigation_amount = target_moisture - soil_moisture
-                    soil_moisture = target_moisture
-                # irrigation_amount = 0
-                # if irrigation_needed:
-                #     # Refill to 80% of field capacity
-                #     target_moisture = awc * 0.8
-                #     irrigation_amount = max(0, target_moisture - soil_moisture)
-                #     soil_moisture = target_moisture  # Apply irrigation
-                #     days_since_irrigation = 0
-                # else:
-                #     days_since_irrigation += 1
-                
-                # Ensure soil moisture never goes below 0
-                soil_moisture = max(0, min(soil_moisture, awc))
-                soil_moisture_percent = (soil_moisture / awc) * 100
-                
-                # Calculate duration and water volume
-                irrigation_duration = irrigation_amount / 10 if irrigation_amount > 0 else 0
-                farm_area = float(farm_size['area'])
-                total_water_liters = irrigation_amount * farm_area * 10 if irrigation_amount > 0 else 0
-
-                # def get_daily_recommendation_fixed(self, irrigation_needed, soil_moisture_percent, rainfall):
-                #     """Generate daily irrigation recommendation based on soil conditions"""
-                #     if rainfall > 10:
-                #         return "No irrigation needed due to sufficient rainfall"
-                #     elif irrigation_needed:
-                #         return f"🚨 IRRIGATION REQUIRED - {soil_moisture_percent:.0f}% soil moisture"
-                #     elif soil_moisture_percent < 40:
-                #         return "⚠️ Soil moisture decreasing - prepare for irrigation soon"
-                #     else:
-                #         return "✅ Soil moisture adequate - monitor daily"
-
-                # Generate proper recommendations
-                recommendation = self.get_recommendation_fixed(
-                    irrigation_needed, depletion_percent, rainfall
-                )
-
-                
-                schedule.append({
-                    'date': date,
-                    'day_name': datetime.strptime(date, '%Y-%m-%d').strftime('%A'),
-                    'weather': {
-                        'temp_max': round(float(weather['temp_max']), 1),
-                        'temp_min': round(float(weather['temp_min']), 1),
-                        'humidity': round(float(weather.get('humidity', 30)), 1),
-                        'rainfall': round(rainfall, 1),
-                        'wind_speed': round(float(weather.get('wind_speed', 5)), 1)
-                    },
-                    'et0': round(et0_values[i], 2),
-                    'etc': round(etc, 2),
-                    'soil_moisture_mm': round(soil_moisture, 1),
-                    'soil_moisture_percent': round(soil_moisture_percent, 1),
-                    'irrigation_needed': bool(irrigation_needed),
-                    'irrigation_amount_mm': round(irrigation_amount, 1),
-                    'irrigation_duration_hours': round(irrigation_duration, 1),
-                    'best_irrigation_time': "06:00-08:00",
-                    'total_water_liters': round(total_water_liters, 0),
-                    'recommendation': recommendation,
-                    'ml_confidence': 75.0,
-                    'prediction_method': 'fao56_method'
-                })
+            # Water balance starts at 50% AWC and refills to 80% past 50% depletion
+            schedule, _ = self.run_water_balance(params, weather_data, et0_values, etc_values)
+            self.cache_schedule(cache_key, schedule, self.weather_request_key(params['location']))
             
             print(f"Generated schedule with {len(schedule)} days")
             return schedule
@@ -386,7 +578,711 @@ class IrrigationCalculator:
             import traceback
             traceback.print_exc()
             raise e
+
+    def calculate_schedule_ensemble(self, user_data, members=DEFAULT_MEMBERS, seed=None, weather_data=None):
+        """
+        Probabilistic companion to calculate_irrigation_schedule: perturbs the
+        forecast into `members` weather members and reports, per day, how
+        likely irrigation is and the P10/P50/P90 water amounts. Pass the
+        weather_data the schedule used so both are centred on the same forecast.
+        """
+        params = self.prepare_farm_params(user_data)
+        if weather_data is None:
+            weather_data = self.get_weather_data(params['location'])
+        
+        result = run_ensemble(
+            weather_to_arrays(weather_data), self.rainfall_array(weather_data),
+            params['kc'], params['awc'], params['farm_area'], members=members, seed=seed
+        )
+        
+        days = []
+        for i, weather in enumerate(weather_data):
+            days.append({
+                'date': weather['date'],
+                'irrigation_probability': round(float(result['irrigation_probability'][i]), 3),
+                'water_mm': self.percentile_dict(result['amount_mm'][:, i], 1),
+                'water_liters': self.percentile_dict(result['amount_liters'][:, i], 0),
+                'et0_mean': round(float(result['et0_mean'][i]), 2),
+                'soil_moisture_percent_p50': round(float(result['soil_moisture_percent_p50'][i]), 1)
+            })
+        
+        return {
+            'members': result['members'],
+            'days': days,
+            'total_water_mm': self.percentile_dict(result['total_mm'], 1),
+            'total_water_liters': self.percentile_dict(result['total_liters'], 0)
+        }
+
+    def percentile_dict(self, values, digits):
+        """{'p10': .., 'p50': .., 'p90': ..} for values ordered as PERCENTILES"""
+        return {f"p{p}": round(float(v), digits) for p, v in zip(PERCENTILES, values)}
+
+    def run_water_balance(self, params, weather_data, et0_values, etc_values, initial_moisture=None):
+        """Water balance for one farm; returns (schedule, end-of-day soil moisture array)"""
+        balance = simulate_water_balance(
+            self.rainfall_array(weather_data),
+            np.array(etc_values, dtype=np.float64),
+            np.array([params['awc']]),
+            initial_moisture=initial_moisture
+        )
+        farm_balance = {key: values[:, 0] for key, values in balance.items()}
+
+        schedule = self.build_schedule(weather_data, et0_values, etc_values,
+                                       farm_balance, params['farm_area'])
+        return schedule, farm_balance['soil_moisture']
+
+    def weather_request_key(self, location):
+        """Weather cache key used for a request location"""
+        location_str = self.weather_client.clean_location_parameter(self.resolve_cache_location(location))
+        return self.weather_client.make_request_key(location_str, 7)
+
+    def weather_digest(self, weather_data):
+        """Canonical hash of a whole forecast series"""
+        payload = json.dumps(weather_data, sort_keys=True, default=float)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def schedule_cache_key(self, params, weather_digest):
+        """Key over weather series, soil, crop, growth stage, area and irrigation method"""
+        return f"{weather_digest}:{self.farm_params_hash(params)}"
+
+    def cache_schedule(self, cache_key, schedule, weather_key):
+        """Memoize a schedule for as long as the weather it was computed from stays cached"""
+        if not self.weather_client.cache:
+            return
+        # Fallback weather is never cached, so its schedules are not either
+        expires_at = self.weather_client.cache.expires_at(weather_key)
+        if expires_at is not None:
+            self.schedule_cache.set(cache_key, copy.deepcopy(schedule), expires_at=expires_at)
+
+    def weather_day_hash(self, day):
+        """Stable fingerprint of one forecast day"""
+        payload = json.dumps(day, sort_keys=True, default=float)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def farm_params_hash(self, params):
+        """Fingerprint of the farm inputs a checkpoint is only valid for"""
+        payload = json.dumps([
+            params['soil_type'], params['crop_name'], params['growth_stage'],
+            params['farm_area'], params['irrigation_method']
+        ], default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def calculate_irrigation_schedule_incremental(self, user_data, checkpoint=None):
+        """
+        Refresh a schedule from a saved soil-water checkpoint.
+        The checkpoint carries the soil moisture at the end of the day before
+        the forecast window (the anchor) plus, per forecast day, the weather
+        hash, end-of-day moisture and the generated record. Days are reused
+        up to the first date whose forecast changed; only the rest is
+        recomputed, starting from the moisture stored for the day before.
+        The result equals a full recompute of the window from the anchor.
+        """
+        params = self.prepare_farm_params(user_data)
+        weather_data = self.get_weather_data(params['location'])
+        if not weather_data:
+            raise ValueError("No weather data available")
+
+        params_hash = self.farm_params_hash(params)
+        dates = [day['date'] for day in weather_data]
+        hashes = [self.weather_day_hash(day) for day in weather_data]
+        anchor_date = (datetime.strptime(dates[0], '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # A checkpoint only applies to the same farm inputs and a contiguous timeline
+        anchor_moisture = None
+        previous_days = {}
+        if checkpoint and checkpoint.get('params_hash') == params_hash:
+            previous_days = {day['date']: day for day in checkpoint.get('days', [])}
+            if checkpoint.get('anchor_date') == anchor_date:
+                anchor_moisture = checkpoint.get('anchor_moisture')
+            elif anchor_date in previous_days:
+                anchor_moisture = previous_days[anchor_date]['soil_moisture']
+            else:
+                previous_days = {}
+
+        reused = 0
+        while reused < len(dates) and \
+                previous_days.get(dates[reused], {}).get('weather_hash') == hashes[reused]:
+            reused += 1
+
+        start_moisture = previous_days[dates[reused - 1]]['soil_moisture'] if reused else anchor_moisture
+
+        new_records = []
+        new_moisture = []
+        if reused < len(weather_data):
+            remaining = weather_data[reused:]
+            et0_values = self.calculate_et0_arrays(**weather_to_arrays(remaining))
+            etc_values = et0_values * params['kc']
+            new_records, new_moisture = self.run_water_balance(
+                params, remaining, et0_values, etc_values,
+                initial_moisture=None if start_moisture is None else np.array([start_moisture])
+            )
+
+        days = [previous_days[date] for date in dates[:reused]]
+        for offset, record in enumerate(new_records):
+            days.append({
+                'date': dates[reused + offset],
+                'weather_hash': hashes[reused + offset],
+                'soil_moisture': float(new_moisture[offset]),
+                'record': record
+            })
+
+        return {
+            'schedule': [day['record'] for day in days],
+            'reused_days': reused,
+            'recomputed_days': len(new_records),
+            'checkpoint': {
+                'params_hash': params_hash,
+                'anchor_date': anchor_date,
+                'anchor_moisture': anchor_moisture,
+                'days': days
+            }
+        }
+
+    def get_forest_predictor(self):
+        if self.forest_predictor is None:
+            with self.forest_predictor_lock:
+                if self.forest_predictor is None:
+                    self.forest_predictor = ml_predictor.IrrigationMLPredictor()
+        return self.forest_predictor
+
+    def ml_feature_columns(self, weather_columns, balance, farm_params, dates):
+        """
+        Trained-model inputs for every (day, farm) of a batch group, as
+        (days, farms) columns. Soil moisture is the level before that day's
+        irrigation; days since irrigation counts from the start of the forecast.
+        """
+        shape = balance['irrigation_needed'].shape
+        irrigated = balance['irrigation_needed']
+        days_since = np.zeros(shape)
+        for t in range(1, shape[0]):
+            days_since[t] = np.where(irrigated[t - 1], 1, days_since[t - 1] + 1)
+
+        growth_stage = np.array([float(params['growth_stage']) for params in farm_params])
+        soil_type = np.array([ml_predictor.SOIL_ENCODING.get(params['soil_type'], 3) for params in farm_params])
+        day_of_year = np.array([datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday for date in dates])
+
+        return {
+            'soil_moisture_percent': 100 - balance['depletion_percent'],
+            'temp_max': weather_columns['temp_max'],
+            'temp_min': weather_columns['temp_min'],
+            'humidity': weather_columns['humidity'],
+            'wind_speed': weather_columns['wind_speed'],
+            'days_since_irrigation': days_since,
+            'growth_stage': np.broadcast_to(growth_stage, shape),
+            'soil_type': np.broadcast_to(soil_type, shape),
+            'day_of_year': np.broadcast_to(day_of_year[:, None], shape)
+        }
+
+    def apply_ml_predictions(self, ml_groups, results):
+        """
+        Score every (day, farm) of the batch with the trained models in one
+        predict_batch call and attach the predictions to the schedule days.
+        """
+        predictor = self.get_forest_predictor()
+        features = np.concatenate([
+            predictor.prepare_feature_matrix({name: values.ravel() for name, values in columns.items()})
+            for _, columns in ml_groups
+        ])
+        predictions = predictor.predict_batch(features)
+        print(f"ML batch prediction: {len(features)} farm-days ({predictions['method']})")
+
+        offset = 0
+        for indices, columns in ml_groups:
+            shape = columns['soil_moisture_percent'].shape
+            size = shape[0] * shape[1]
+            need = predictions['need_irrigation'][offset:offset + size].reshape(shape)
+            amount = predictions['irrigation_amount_mm'][offset:offset + size].reshape(shape)
+            confidence = predictions['confidence'][offset:offset + size].reshape(shape)
+            offset += size
+
+            for col, index in enumerate(indices):
+                for t, day in enumerate(results[index]['schedule']):
+                    day['ml_need_irrigation'] = bool(need[t, col])
+                    day['ml_irrigation_amount_mm'] = float(amount[t, col])
+                    day['ml_confidence'] = float(confidence[t, col])
+                    day['ml_prediction_method'] = predictions['method']
+                    day['ml_model_version'] = predictions['model_version']
+
+    def calculate_batch_schedules(self, farms, include_ml=False):
+        """
+        Generate schedules for many farms at once.
+        Farms are grouped by location so weather is fetched once per location,
+        then ET0 and the water balance run as (days, farms) arrays.
+        With include_ml, every farm-day is also scored by the trained models
+        in a single batched prediction (cached schedules are recomputed).
+        Returns one {'schedule', 'summary'} or {'error'} entry per farm, in order.
+        """
+        results = [None] * len(farms)
+        params_by_index = {}
+
+        for index, user_data in enumerate(farms):
+            try:
+                params_by_index[index] = self.prepare_farm_params(user_data)
+            except Exception as e:
+                results[index] = {'error': f"Invalid farm data: {e}"}
+
+        # One weather fetch per distinct location, fetched concurrently
+        indices = list(params_by_index)
+        locations = [params_by_index[index]['location'] for index in indices]
+        fetched = fetch_weather_for_locations(
+            self.weather_client,
+            [self.resolve_location_query(location) for location in locations],
+            key_locations=[self.resolve_cache_location(location) for location in locations]
+        )
+        weather_by_location = {}
+        location_of_farm = {}
+        for index, entry in zip(indices, fetched):
+            location_of_farm[index] = entry['key']
+            weather_by_location.setdefault(entry['key'], entry['weather'])
+
+        print(f"Batch schedule: {len(params_by_index)} farms across {len(weather_by_location)} locations")
+
+        # Serve repeated (forecast, farm inputs) combinations from the schedule cache
+        digest_by_location = {key: self.weather_digest(weather) for key, weather in weather_by_location.items()}
+        cache_keys = {}
+        for index, location_key in location_of_farm.items():
+            cache_keys[index] = self.schedule_cache_key(params_by_index[index], digest_by_location[location_key])
+            cached = None if include_ml else self.schedule_cache.get(cache_keys[index])
+            if cached is not None:
+                schedule = copy.deepcopy(cached)
+                results[index] = {'schedule': schedule, 'summary': self.get_schedule_summary(schedule)}
+
+        # Farms whose forecasts have the same length share one (days, farms) pass
+        groups = {}
+        for index, location_key in location_of_farm.items():
+            if results[index] is not None:
+                continue
+            days = len(weather_by_location[location_key])
+            groups.setdefault(days, []).append(index)
+
+        ml_groups = []
+        for days, indices in groups.items():
+            if days == 0:
+                for index in indices:
+                    results[index] = {'error': 'No weather data available'}
+                continue
+
+            location_keys = sorted({location_of_farm[index] for index in indices})
+            location_column = {key: col for col, key in enumerate(location_keys)}
+            farm_columns = np.array([location_column[location_of_farm[index]] for index in indices])
+
+            location_arrays = [weather_to_arrays(weather_by_location[key]) for key in location_keys]
+            weather_columns = {
+                name: np.stack([arrays[name] for arrays in location_arrays], axis=1)[:, farm_columns]
+                for name in location_arrays[0]
+            }
+            rainfall = np.stack(
+                [self.rainfall_array(weather_by_location[key]) for key in location_keys], axis=1
+            )[:, farm_columns]
+
+            soil_codes, crop_codes = self.parameter_codes([params_by_index[index] for index in indices])
+            kc = self.parameters.stage_kc(crop_codes, [params_by_index[index]['growth_stage'] for index in indices])
+            awc = self.parameters.awc[soil_codes, crop_codes]
+
+            et0 = self.calculate_et0_arrays(**weather_columns)
+            etc = et0 * kc[None, :]
+            balance = simulate_water_balance(rainfall, etc, awc)
+
+            for col, index in enumerate(indices):
+                farm_balance = {key: values[:, col] for key, values in balance.items()}
+                schedule = self.build_schedule(
+                    weather_by_location[location_of_farm[index]],
+                    et0[:, col], etc[:, col], farm_balance,
+                    params_by_index[index]['farm_area']
+                )
+                self.cache_schedule(cache_keys[index], schedule, location_of_farm[index])
+                results[index] = {
+                    'schedule': schedule,
+                    'summary': self.get_schedule_summary(schedule)
+                }
+
+            if include_ml:
+                dates = [day['date'] for day in weather_by_location[location_of_farm[indices[0]]]]
+                ml_groups.append((indices, self.ml_feature_columns(
+                    weather_columns, balance, [params_by_index[index] for index in indices], dates
+                )))
+
+        if ml_groups:
+            self.apply_ml_predictions(ml_groups, results)
+
+        return results
     
+    def parameter_codes(self, farm_params):
+        """(soil_codes, crop_codes) integer arrays for a list of prepared farm params"""
+        return (np.array([params['soil_code'] for params in farm_params], dtype=np.intp),
+                np.array([params['crop_code'] for params in farm_params], dtype=np.intp))
+
+    def stage_kc(self, crop_code, day_numbers):
+        """(stages, kc) for each day counted from planting"""
+        store = self.parameters
+        stages = np.clip(np.searchsorted(store.stage_starts[crop_code], day_numbers, side='right') - 1, 0, 3)
+        return stages, store.kc[crop_code, stages]
+
+    def merge_forecast(self, dates, location, forecast_by_date):
+        """Forecast days where available, regional climatology for the rest"""
+        climatology = self.weather_client.get_climatology_weather(dates, location)
+        return [forecast_by_date.get(day['date'], day) for day in climatology]
+
+    def simulate_season(self, user_data, chunk_days=31):
+        """
+        Walk the whole crop season from planting_date, yielding one day
+        record at a time. Kc follows the growth stage reached on each day;
+        forecast weather is used where available, climatology elsewhere.
+        Days are processed in vectorized chunks so memory stays flat.
+        """
+        params = self.prepare_farm_params(user_data)
+        location = params['location']
+        
+        start_date = self.parse_planting_date(user_data) or datetime.now()
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        season_length = int(self.parameters.season_length[params['crop_code']])
+        
+        forecast_by_date = {day['date']: day for day in self.get_weather_data(location)}
+        soil_moisture = None
+        
+        for chunk_start in range(0, season_length, chunk_days):
+            day_numbers = np.arange(chunk_start, min(chunk_start + chunk_days, season_length))
+            dates = [start_date + timedelta(days=int(day)) for day in day_numbers]
+            
+            weather_data = self.merge_forecast(dates, location, forecast_by_date)
+            stages, kc = self.stage_kc(params['crop_code'], day_numbers)
+            et0_values = self.calculate_et0_arrays(**weather_to_arrays(weather_data))
+            etc_values = et0_values * kc
+            
+            records, moisture = self.run_water_balance(
+                params, weather_data, et0_values, etc_values,
+                initial_moisture=soil_moisture
+            )
+            soil_moisture = moisture[-1:]
+            
+            for day_number, stage, day_kc, weather, record in zip(day_numbers, stages, kc, weather_data, records):
+                record['day_of_season'] = int(day_number)
+                record['growth_stage'] = int(stage)
+                record['kc'] = float(day_kc)
+                record['weather_source'] = 'forecast' if weather['date'] in forecast_by_date else 'climatology'
+                yield record
+
+    def parse_planting_date(self, user_data):
+        """crop_info.planting_date as a datetime, None if absent; ValueError if malformed"""
+        planting_date = user_data['crop_info'].get('planting_date')
+        if not planting_date:
+            return None
+        try:
+            return datetime.strptime(str(planting_date), '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"planting_date must be YYYY-MM-DD, got '{planting_date}'")
+
+    def horizon_inputs(self, user_data, params, forecast, horizon_days):
+        """Weather series and daily Kc for the next horizon_days, starting today"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        dates = [today + timedelta(days=i) for i in range(horizon_days)]
+        forecast_by_date = {day['date']: day for day in forecast}
+        weather_data = self.merge_forecast(dates, params['location'], forecast_by_date)
+        
+        planting_date = self.parse_planting_date(user_data)
+        if planting_date:
+            # Follow the growth stages from planting across the horizon
+            day_numbers = np.array([(date - planting_date).days for date in dates])
+            _, kc = self.stage_kc(params['crop_code'], day_numbers)
+        else:
+            kc = np.full(horizon_days, params['kc'])
+        
+        sources = ['forecast' if day['date'] in forecast_by_date else 'climatology' for day in weather_data]
+        return weather_data, kc, sources
+
+    def optimize_batch_plans(self, farms, horizon_days=None, **cost_options):
+        """
+        Water-minimizing irrigation plans for many farms.
+        Weather is fetched once per location; every farm's horizon is then
+        solved in one vectorized dynamic program (see irrigation_optimizer).
+        horizon_days defaults to the forecast length; longer horizons use
+        climatology past the forecast. Returns one {'plan', 'summary'} or
+        {'error'} entry per farm, in order.
+        """
+        results = [None] * len(farms)
+        params_by_index = {}
+        
+        for index, user_data in enumerate(farms):
+            try:
+                params = self.prepare_farm_params(user_data)
+                self.parse_planting_date(user_data)
+                params_by_index[index] = params
+            except Exception as e:
+                results[index] = {'error': f"Invalid farm data: {e}"}
+        
+        indices = list(params_by_index)
+        if not indices:
+            return results
+        
+        locations = [params_by_index[index]['location'] for index in indices]
+        fetched = fetch_weather_for_locations(
+            self.weather_client,
+            [self.resolve_location_query(location) for location in locations],
+            key_locations=[self.resolve_cache_location(location) for location in locations]
+        )
+        horizon = horizon_days or max(len(entry['weather']) for entry in fetched)
+        
+        inputs = []
+        for index, entry in zip(indices, fetched):
+            inputs.append(self.horizon_inputs(farms[index], params_by_index[index], entry['weather'], horizon))
+        
+        rainfall = np.stack([self.rainfall_array(weather_data) for weather_data, _, _ in inputs], axis=1)
+        et0 = np.stack([self.calculate_et0_arrays(**weather_to_arrays(weather_data))
+                        for weather_data, _, _ in inputs], axis=1)
+        etc = et0 * np.stack([kc for _, kc, _ in inputs], axis=1)
+        soil_codes, crop_codes = self.parameter_codes([params_by_index[index] for index in indices])
+        awc = self.parameters.awc[soil_codes, crop_codes]
+        max_depletion = self.parameters.allowed_depletion[soil_codes, crop_codes]
+        
+        print(f"Optimizing {len(indices)} farms over {horizon} days")
+        plan = optimize_irrigation(rainfall, etc, awc, max_depletion, **cost_options)
+        # The current threshold rule on the same inputs, for comparison
+        greedy = simulate_water_balance(rainfall, etc, awc)
+        
+        for col, index in enumerate(indices):
+            params = params_by_index[index]
+            weather_data, _, sources = inputs[col]
+            days = []
+            for t, weather in enumerate(weather_data):
+                amount = float(plan['irrigation_amount'][t, col])
+                days.append({
+                    'date': weather['date'],
+                    'irrigate': amount > 0,
+                    'irrigation_amount_mm': round(amount, 1),
+                    'total_water_liters': round(amount * params['farm_area'] * 10, 0),
+                    'irrigation_duration_hours': round(amount / 10, 1),
+                    'rainfall': round(float(rainfall[t, col]), 1),
+                    'etc': round(float(etc[t, col]), 2),
+                    'soil_moisture_mm': round(float(plan['soil_moisture'][t, col]), 1),
+                    'soil_moisture_percent': round(float(plan['soil_moisture'][t, col] / params['awc'] * 100), 1),
+                    'weather_source': sources[t]
+                })
+            
+            total_mm = float(plan['total_water_mm'][col])
+            greedy_mm = float(greedy['irrigation_amount'][:, col].sum())
+            results[index] = {
+                'plan': days,
+                'summary': {
+                    'horizon_days': horizon,
+                    'irrigation_events': int(plan['irrigation_events'][col]),
+                    'total_water_mm': round(total_mm, 1),
+                    'total_water_liters': round(total_mm * params['farm_area'] * 10, 0),
+                    'total_cost': round(float(plan['total_cost'][col]), 1),
+                    'stress_days': int(plan['stress_days'][col]),
+                    'min_soil_moisture_mm': round(float(plan['floor'][col]), 1),
+                    'rule_based_events': int(greedy['irrigation_needed'][:, col].sum()),
+                    'rule_based_water_mm': round(greedy_mm, 1),
+                    'water_saved_mm': round(greedy_mm - total_mm, 1)
+                }
+            }
+        
+        return results
+
+    def schedule_farm_zones(self, farm_data):
+        """
+        Time slots for every zone of one farm sharing a single pump.
+        Each zone's daily need comes from the water balance on the farm's
+        forecast; zones are then packed into the pump's time windows in
+        order of urgency (depletion relative to what the crop tolerates).
+        """
+        location = farm_data['location']
+        pump_flow_lph = float(farm_data['pump_flow_lph'])
+        windows = farm_data.get('windows') or DEFAULT_WINDOWS
+        zones = farm_data['zones']
+        
+        zone_params = []
+        for zone in zones:
+            try:
+                zone_params.append(self.prepare_farm_params({
+                    'location': location,
+                    'soil_type': zone['soil_type'],
+                    'crop_info': zone['crop_info'],
+                    'farm_size': {'area': zone['area']}
+                }))
+            except Exception as e:
+                raise ValueError(f"Invalid zone {zone.get('zone_id')}: {e}")
+        
+        weather_data = self.get_weather_data(location)
+        et0 = self.calculate_et0_arrays(**weather_to_arrays(weather_data))
+        soil_codes, crop_codes = self.parameter_codes(zone_params)
+        kc = self.parameters.stage_kc(crop_codes, [params['growth_stage'] for params in zone_params])
+        awc = self.parameters.awc[soil_codes, crop_codes]
+        area = np.array([params['farm_area'] for params in zone_params])
+        balance = simulate_water_balance(self.rainfall_array(weather_data), et0[:, None] * kc[None, :], awc)
+        
+        tolerance = self.parameters.allowed_depletion[soil_codes, crop_codes] * 100
+        urgency = balance['depletion_percent'] / tolerance[None, :]
+        liters = balance['irrigation_amount'] * area[None, :] * 10
+        
+        zone_ids = [str(zone.get('zone_id', index)) for index, zone in enumerate(zones)]
+        # Without a zone flow, apply 10 mm/hour as build_schedule assumes
+        flows = [float(zone.get('flow_lph') or params['farm_area'] * 100)
+                 for zone, params in zip(zones, zone_params)]
+        for zone_id, flow in zip(zone_ids, flows):
+            if flow <= 0:
+                raise ValueError(f"Invalid zone {zone_id}: needs a positive area or flow_lph")
+        jobs_by_day = []
+        for day, weather in enumerate(weather_data):
+            needed = np.flatnonzero(balance['irrigation_needed'][day])
+            jobs_by_day.append((weather['date'], [
+                {'zone_id': zone_ids[z], 'liters': float(liters[day, z]),
+                 'flow_lph': flows[z], 'urgency': float(urgency[day, z])}
+                for z in needed
+            ]))
+        
+        slots, unscheduled = schedule_zones(jobs_by_day, pump_flow_lph, windows)
+        
+        zone_summary = {
+            zone_id: {'zone_id': zone_id, 'liters_needed': 0.0, 'liters_scheduled': 0.0,
+                      'slots': 0, 'best_irrigation_time': None}
+            for zone_id in zone_ids
+        }
+        for z, zone_id in enumerate(zone_ids):
+            zone_summary[zone_id]['liters_needed'] += float(liters[:, z].sum())
+        for slot in slots:
+            summary = zone_summary[slot['zone_id']]
+            summary['liters_scheduled'] += slot['liters']
+            summary['slots'] += 1
+            if summary['best_irrigation_time'] is None:
+                summary['best_irrigation_time'] = (
+                    f"{format_minutes(slot['start_minute'])}-{format_minutes(slot['end_minute'])}"
+                )
+        for summary in zone_summary.values():
+            summary['liters_unscheduled'] = round(max(0.0, summary['liters_needed'] - summary['liters_scheduled']), 0)
+            summary['liters_needed'] = round(summary['liters_needed'], 0)
+            summary['liters_scheduled'] = round(summary['liters_scheduled'], 0)
+        
+        return {
+            'slots': [{
+                'date': slot['date'],
+                'zone_id': slot['zone_id'],
+                'start': format_minutes(slot['start_minute']),
+                'end': format_minutes(slot['end_minute']),
+                'flow_lph': round(slot['flow_lph'], 0),
+                'liters': round(slot['liters'], 0)
+            } for slot in slots],
+            'zones': list(zone_summary.values()),
+            'summary': {
+                'zones': len(zones),
+                'pump_flow_lph': pump_flow_lph,
+                'windows': list(windows),
+                'total_slots': len(slots),
+                'total_liters_scheduled': round(sum(slot['liters'] for slot in slots), 0),
+                'total_liters_unscheduled': round(sum(job['liters'] for job in unscheduled), 0)
+            }
+        }
+
+    def allocate_village_water(self, farms, daily_capacity_liters, fairness='weighted'):
+        """
+        Share one source (canal, tank) across many farms.
+        Per-day demands come from the batch schedules; each day the capacity
+        is split max-min fairly, weighted by crop stress sensitivity
+        (1 / critical_depletion) unless fairness is 'equal'. Unmet demand is
+        deferred to later days. Returns per-farm plans plus daily totals.
+        """
+        schedules = self.calculate_batch_schedules(farms)
+        valid = [index for index, result in enumerate(schedules) if 'schedule' in result]
+        dates = sorted({day['date'] for index in valid for day in schedules[index]['schedule']})
+        date_index = {date: t for t, date in enumerate(dates)}
+        
+        capacity = np.asarray(daily_capacity_liters, dtype=np.float64)
+        if capacity.ndim == 1 and len(capacity) != len(dates):
+            raise ValueError(f"daily_capacity_liters needs one value per day ({len(dates)})")
+        
+        demand = np.zeros((len(dates), len(valid)))
+        weights = np.ones(len(valid))
+        for col, index in enumerate(valid):
+            for day in schedules[index]['schedule']:
+                demand[date_index[day['date']], col] = day['total_water_liters']
+        if fairness != 'equal':
+            crop_codes = [self.parameters.crop_code(farms[index]['crop_info']['name']) for index in valid]
+            weights = 1 / self.parameters.critical_depletion[crop_codes]
+        
+        allocation = allocate_water(demand, capacity, weights)
+        print(f"Village allocation: {len(valid)} farms, {len(dates)} days")
+        
+        col_of = {index: col for col, index in enumerate(valid)}
+        results = []
+        for index, result in enumerate(schedules):
+            if index not in col_of:
+                results.append(result)
+                continue
+            col = col_of[index]
+            results.append({
+                'plan': [{
+                    'date': date,
+                    'demand_liters': round(float(demand[t, col]), 0),
+                    'allocated_liters': round(float(allocation['allocated'][t, col]), 0),
+                    'deferred_liters': round(float(allocation['deferred'][t, col]), 0)
+                } for t, date in enumerate(dates)],
+                'total_demand_liters': round(float(demand[:, col].sum()), 0),
+                'total_allocated_liters': round(float(allocation['allocated'][:, col].sum()), 0),
+                'unmet_liters': round(float(allocation['unmet'][col]), 0),
+                'weight': round(float(weights[col]), 2)
+            })
+        
+        daily_capacity = np.broadcast_to(capacity, (len(dates),))
+        return {
+            'farms': results,
+            'days': [{
+                'date': date,
+                'capacity_liters': round(float(daily_capacity[t]), 0),
+                'demand_liters': round(float(demand[t].sum()), 0),
+                'allocated_liters': round(float(allocation['allocated'][t].sum()), 0),
+                'deferred_liters': round(float(allocation['deferred'][t].sum()), 0)
+            } for t, date in enumerate(dates)],
+            'unmet_liters': round(float(allocation['unmet'].sum()), 0)
+        }
+
+    def what_if_sweep(self, location, soil_types, crops, growth_stages, areas, irrigation_methods):
+        """
+        Water totals for every combination of the given soils, crops, growth
+        stages, areas and irrigation methods on one forecast.
+        Weather is fetched once; soil x crop x stage variants run as one
+        broadcast (days, S*C*G) water balance. Area and method only scale
+        the liters (gross liters = net / method efficiency).
+        Returns a compact {'columns', 'rows'} table.
+        """
+        store = self.parameters
+        soil_codes = np.array([store.soil_code(soil) for soil in soil_types], dtype=np.intp)
+        crop_codes = np.array([store.crop_code(crop) for crop in crops], dtype=np.intp)
+        stages = np.array(growth_stages)
+        areas = np.array([float(area) for area in areas])
+        for method in irrigation_methods:
+            if method not in IRRIGATION_EFFICIENCY:
+                raise ValueError(f"Unknown irrigation method '{method}'")
+        efficiency = np.array([IRRIGATION_EFFICIENCY[method] for method in irrigation_methods])
+        
+        weather_data = self.get_weather_data(location)
+        et0 = self.calculate_et0_arrays(**weather_to_arrays(weather_data))
+        
+        # (S, C, G) parameter grids, flattened onto the farms axis
+        shape = (len(soil_codes), len(crop_codes), len(stages))
+        awc = np.broadcast_to(store.awc[soil_codes][:, crop_codes][:, :, None], shape)
+        kc = np.broadcast_to(store.stage_kc(crop_codes[:, None], stages[None, :])[None, :, :], shape)
+        balance = simulate_water_balance(self.rainfall_array(weather_data),
+                                         et0[:, None] * kc.reshape(-1)[None, :], awc.reshape(-1))
+        
+        water_mm = balance['irrigation_amount'].sum(axis=0).reshape(shape)
+        irrigation_days = balance['irrigation_needed'].sum(axis=0).reshape(shape)
+        net_liters = water_mm[..., None] * areas * 10           # (S, C, G, A)
+        gross_liters = net_liters[..., None] / efficiency       # (S, C, G, A, M)
+        
+        rows = []
+        for s, c, g, a, m in np.ndindex(gross_liters.shape):
+            rows.append([
+                soil_types[s], crops[c], growth_stages[g], float(areas[a]), irrigation_methods[m],
+                int(irrigation_days[s, c, g]), round(float(water_mm[s, c, g]), 1),
+                round(float(net_liters[s, c, g, a]), 0), round(float(gross_liters[s, c, g, a, m]), 0)
+            ])
+        
+        return {
+            'columns': ['soil_type', 'crop', 'growth_stage', 'area', 'irrigation_method',
+                        'irrigation_days', 'total_water_mm', 'net_water_liters', 'gross_water_liters'],
+            'rows': rows,
+            'days': len(weather_data)
+        }
+
     def get_recommendation_fixed(self, irrigation_needed, depletion_percent, rainfall):
         if rainfall > 10:
             return "No irrigation needed due to sufficient rainfall"
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+
+from models.water_balance import DEFAULT_INITIAL_FRACTION
+
+# Soil water is tracked on this many evenly spaced levels from 0 to AWC
+DEFAULT_GRID_LEVELS = int(os.getenv('OPTIMIZER_GRID_LEVELS', 101))
+# Cost units: one unit per mm applied, plus a fixed cost per pumping event
+DEFAULT_WATER_COST = float(os.getenv('OPTIMIZER_WATER_COST', 1.0))
+DEFAULT_PUMP_COST = float(os.getenv('OPTIMIZER_PUMP_COST', 10.0))
+# Cost of a day that ends below the stress floor, plus the same again per mm
+# below it. Large enough that the floor is only broken when no irrigation
+# plan can hold it, however small the shortfall.
+STRESS_PENALTY = 1000.0
+# Smallest application worth running the pump for (mm)
+DEFAULT_MIN_EVENT_MM = float(os.getenv('OPTIMIZER_MIN_EVENT_MM', 1.0))
+# Farms solved together; the value tables are (days, farms, levels) float64
+DEFAULT_CHUNK_FARMS = 256
+
+
+def _interpolate(value, moisture, awc, levels):
+    """Value function at continuous soil water, linear between grid levels"""
+    position = moisture / awc[:, None] * (levels - 1)
+    low = np.clip(np.floor(position).astype(np.intp), 0, levels - 2)
+    weight = position - low
+    return ((1 - weight) * np.take_along_axis(value, low, axis=1) +
+            weight * np.take_along_axis(value, low + 1, axis=1))
+
+
+def _cost_after(value_next, moisture, rainfall, etc, awc, floor, levels):
+    """Cost from the end of a day on, for soil water (farms, k) after the morning's irrigation"""
+    next_moisture = np.clip(moisture + (rainfall - etc)[:, None], 0.0, awc[:, None])
+    shortfall = np.maximum(0.0, floor[:, None] - next_moisture)
+    stress_cost = STRESS_PENALTY * (shortfall + (shortfall > 1e-9))
+    return _interpolate(value_next, next_moisture, awc, levels) + stress_cost
+
+
+def _best_targets(target_cost):
+    """Suffix minimum of target_cost over levels, with the first level that attains it"""
+    levels = target_cost.shape[1]
+    suffix_min = np.minimum.accumulate(target_cost[:, ::-1], axis=1)[:, ::-1]
+    attains = np.where(target_cost <= suffix_min, np.arange(levels), levels)
+    suffix_arg = np.minimum.accumulate(attains[:, ::-1], axis=1)[:, ::-1]
+    return suffix_min, suffix_arg
+
+
+def _solve_chunk(rainfall, etc, awc, floor, initial_moisture, levels,
+                 water_cost, pump_cost, min_event_mm):
+    days, farms = etc.shape
+    grid = np.linspace(0.0, 1.0, levels)
+    moisture = awc[:, None] * grid[None, :]                  # (farms, levels)
+    cost_of_level = water_cost * moisture
+    farm_index = np.arange(farms)
+
+    # Backward pass over the grid levels. Irrigation happens in the morning:
+    # from level i the farm can be topped up by at least min_event_mm to any
+    # level j, then the day's rain and ETc apply. values[t] holds the cost
+    # from day t + 1 on, read between levels by linear interpolation.
+    values = np.empty((days, farms, levels))
+    value = np.zeros((farms, levels))
+    step = awc / (levels - 1)
+    min_steps = np.maximum(1, np.ceil(min_event_mm / step - 1e-9)).astype(np.intp)
+    first_target = np.minimum(np.arange(levels)[None, :] + min_steps[:, None], levels)
+    for t in range(days - 1, -1, -1):
+        values[t] = value
+        after = _cost_after(value, moisture, rainfall[t], etc[t], awc, floor, levels)
+        suffix_min, _ = _best_targets(cost_of_level + after)
+        padded = np.concatenate([suffix_min, np.full((farms, 1), np.inf)], axis=1)
+        irrigate_cost = pump_cost + np.take_along_axis(padded, first_target, axis=1) - cost_of_level
+        # Ties go to not irrigating
+        value = np.minimum(irrigate_cost, after)
+
+    # Forward pass on continuous soil water, choosing each morning with the
+    # same interpolated costs the backward pass used, so rounding to a level
+    # never triggers a top-up of its own
+    soil = np.clip(initial_moisture, 0.0, awc)
+    out = {
+        'irrigation_amount': np.empty((days, farms)),
+        'soil_moisture': np.empty((days, farms)),
+        'stress': np.empty((days, farms), dtype=bool)
+    }
+    for t in range(days):
+        suffix_min, suffix_arg = _best_targets(
+            cost_of_level + _cost_after(values[t], moisture, rainfall[t], etc[t], awc, floor, levels)
+        )
+        stay_cost = _cost_after(values[t], soil[:, None], rainfall[t], etc[t], awc, floor, levels)[:, 0]
+        lowest = np.ceil((soil + min_event_mm) / step - 1e-9).astype(np.intp)
+        lowest = np.maximum(lowest, np.floor(soil / step + 1e-9).astype(np.intp) + 1)
+        reachable = lowest < levels
+        lowest = np.minimum(lowest, levels - 1)
+        irrigate_cost = np.where(reachable, pump_cost + suffix_min[farm_index, lowest] - water_cost * soil, np.inf)
+        target = suffix_arg[farm_index, lowest]
+
+        amount = np.where(irrigate_cost < stay_cost, moisture[farm_index, target] - soil, 0.0)
+        soil = np.clip(soil + amount + rainfall[t] - etc[t], 0.0, awc)
+        out['irrigation_amount'][t] = amount
+        out['soil_moisture'][t] = soil
+        out['stress'][t] = soil < floor - 1e-9
+
+    return out
+
+
+def optimize_irrigation(rainfall, etc, awc, max_depletion, initial_moisture=None,
+                        levels=DEFAULT_GRID_LEVELS, water_cost=DEFAULT_WATER_COST,
+                        pump_cost=DEFAULT_PUMP_COST, min_event_mm=DEFAULT_MIN_EVENT_MM,
+                        chunk_farms=DEFAULT_CHUNK_FARMS):
+    """
+    Minimum-cost irrigation plan by dynamic programming over days.
+    rainfall and etc are (days, farms) arrays (a 1-D series is one column);
+    awc and max_depletion are per farm. Soil water must end every day at or
+    above awc * (1 - max_depletion) and never exceeds awc. Cost is
+    water_cost per mm applied plus pump_cost per irrigation event, and
+    every event applies at least min_event_mm.
+    Transitions are vectorized over farms and grid levels, so each day is a
+    handful of (farms, levels) array operations.
+    Returns (days, farms) arrays plus per-farm totals.
+    """
+    etc = np.asarray(etc, dtype=np.float64)
+    if etc.ndim == 1:
+        etc = etc[:, None]
+    rainfall = np.asarray(rainfall, dtype=np.float64)
+    if rainfall.ndim == 1:
+        rainfall = rainfall[:, None]
+    rainfall = np.broadcast_to(rainfall, etc.shape)
+    farms = etc.shape[1]
+    awc = np.broadcast_to(np.asarray(awc, dtype=np.float64), (farms,))
+    floor = awc * (1 - np.broadcast_to(np.asarray(max_depletion, dtype=np.float64), (farms,)))
+
+    if initial_moisture is None:
+        initial_moisture = awc * DEFAULT_INITIAL_FRACTION
+    initial_moisture = np.broadcast_to(np.asarray(initial_moisture, dtype=np.float64), (farms,))
+
+    chunks = []
+    for start in range(0, farms, chunk_farms):
+        cols = slice(start, start + chunk_farms)
+        chunks.append(_solve_chunk(
+            rainfall[:, cols], etc[:, cols], awc[cols], floor[cols],
+            initial_moisture[cols], levels, water_cost, pump_cost, min_event_mm
+        ))
+    result = {key: np.concatenate([chunk[key] for chunk in chunks], axis=1) for key in chunks[0]}
+
+    events = (result['irrigation_amount'] > 0).sum(axis=0)
+    total_mm = result['irrigation_amount'].sum(axis=0)
+    result['floor'] = floor
+    result['total_water_mm'] = total_mm
+    result['irrigation_events'] = events
+    result['stress_days'] = result['stress'].sum(axis=0)
+    result['total_cost'] = water_cost * total_mm + pump_cost * events
+    return result
@@ -1,37 +1,97 @@
-import joblib
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
 import os
+import threading
+import time
+
+from models.model_registry import ModelRegistry
+from utils.prediction_cache import PredictionCache
+
+SOIL_ENCODING = {'Sandy': 1, 'Clay': 2, 'Loam': 3, 'Sandy Loam': 4}
+# Seconds between checks of the registry's CURRENT pointer; 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', 30))
+FALLBACK_VERSION = 'rule_based_fallback'
+# Compiled forests win on small inputs; numpy traversal of (rows, trees)
+# falls behind sklearn's C loops at a few hundred rows
+COMPILED_MAX_ROWS = int(os.getenv('ML_COMPILED_MAX_ROWS', 256))
 
 class IrrigationMLPredictor:
-    def __init__(self):
-        self.classifier = None  # Predicts irrigation need (Yes/No)
-        self.regressor = None   # Predicts irrigation amount (mm)
-        self.scaler = None      # Feature scaling
+    def __init__(self, registry=None, prediction_cache=None):
+        # Classifier (irrigation need), regressor (amount) and scaler of the
+        # active registry version, swapped as one LoadedModels on reload
+        self.models = None
+        self.registry = registry or ModelRegistry()
         self.feature_names = [
             'soil_moisture_percent', 'temp_max', 'temp_min', 'temp_avg',
             'humidity', 'wind_speed', 'days_since_irrigation', 
             'growth_stage', 'soil_type_encoded', 'day_of_year'
         ]
+        # Opt-in cache on quantized features (ML_PREDICTION_CACHE)
+        self.prediction_cache = prediction_cache or PredictionCache.from_env(self.feature_names)
+        self.reload_interval = MODEL_RELOAD_INTERVAL
+        self.last_reload_check = time.monotonic()
+        self.reload_lock = threading.Lock()
+        self.predictions_by_version = {}
+        self.stats_lock = threading.Lock()
         self.load_models()
     
-    def load_models(self):
-        """Load pre-trained models"""
-        model_dir = 'ml_models'
+    def load_models(self, version=None):
+        """Load a registry version (default: the current one); keep the old models on failure"""
         try:
-            self.classifier = joblib.load(f'{model_dir}/irrigation_classifier.pkl')
-            self.regressor = joblib.load(f'{model_dir}/irrigation_regressor.pkl')
-            self.scaler = joblib.load(f'{model_dir}/feature_scaler.pkl')
-            print("ML models loaded successfully")
-        except FileNotFoundError:
-            print("ML models not found. Using fallback calculations.")
+            print(f"Looking for models in: {os.path.abspath(self.registry.root)}")
+            models = self.registry.load(version)
+            if models.feature_names and list(models.feature_names) != self.feature_names:
+                raise ValueError(f"Model version {models.version} expects features {models.feature_names}")
+            self.models = models
+            form = 'compiled' if models.compiled else 'sklearn'
+            print(f"ML models loaded successfully (version {models.version}, {form})")
+            return True
+        except FileNotFoundError as e:
+            print(f"ML models not found: {e}. {self.keeping_message()}")
+        except Exception as e:
+            print(f"Error loading ML models: {e}. {self.keeping_message()}")
+        return False
+    
+    def keeping_message(self):
+        if self.models is not None:
+            return f"Keeping version {self.models.version}."
+        return "Using fallback calculations."
+    
+    def active_models(self):
+        """Models to predict with, picking up a new CURRENT version at most every reload_interval"""
+        now = time.monotonic()
+        if self.reload_interval > 0 and now - self.last_reload_check >= self.reload_interval:
+            # One thread checks; the rest keep predicting with the models they have
+            if self.reload_lock.acquire(blocking=False):
+                try:
+                    self.last_reload_check = now
+                    version = self.registry.current_version()
+                    if version and (self.models is None or version != self.models.version):
+                        self.load_models(version)
+                finally:
+                    self.reload_lock.release()
+        return self.models
+    
+    def record_predictions(self, version, count=1):
+        with self.stats_lock:
+            self.predictions_by_version[version] = self.predictions_by_version.get(version, 0) + count
+    
+    def stats(self):
+        models = self.models
+        with self.stats_lock:
+            predictions = dict(self.predictions_by_version)
+        return {
+            'active_version': models.version if models else None,
+            'compiled': bool(models and models.compiled),
+            'loaded_at': models.loaded_at.isoformat() if models else None,
+            'available_versions': self.registry.versions(),
+            'predictions_by_version': predictions,
+            'prediction_cache': self.prediction_cache.stats() if self.prediction_cache else None
+        }
     
     def prepare_features(self, data):
         """Convert input data to model features"""
         # Encode soil type
-        soil_encoding = {'Sandy': 1, 'Clay': 2, 'Loam': 3, 'Sandy Loam': 4}
+        soil_encoding = SOIL_ENCODING
         
         features = np.array([
             data['soil_moisture_percent'],
@@ -48,36 +108,133 @@ class IrrigationMLPredictor:
         
         return features
     
+    def predict_matrix(self, features, models):
+        """
+        (need, amount, probability) arrays for raw feature rows, from the
+        compiled forests for up to COMPILED_MAX_ROWS rows (or when there are
+        no pickles), else the sklearn models.
+        predict() is the argmax of predict_proba, so one forest pass gives both.
+        """
+        sklearn_models = None
+        if not models.compiled or len(features) > COMPILED_MAX_ROWS:
+            sklearn_models = models.sklearn_models()
+        
+        if sklearn_models is None:
+            classifier, regressor = models.compiled_classifier, models.compiled_regressor
+            classes = classifier.classes
+        else:
+            classifier, regressor, scaler = sklearn_models
+            features = scaler.transform(features)
+            classes = classifier.classes_
+        
+        probabilities = classifier.predict_proba(features)
+        need_irrigation = classes[np.argmax(probabilities, axis=1)].astype(bool)
+        
+        # Amounts only for the rows that need water
+        irrigation_amount = np.zeros(len(features))
+        if need_irrigation.any():
+            irrigation_amount[need_irrigation] = np.maximum(0, regressor.predict(features[need_irrigation]))
+        
+        return need_irrigation, irrigation_amount, probabilities[:, 1]
+    
+    def predict_rows(self, features, models):
+        """predict_matrix, through the prediction cache when one is enabled"""
+        if self.prediction_cache is None:
+            return self.predict_matrix(features, models)
+        return self.prediction_cache.predict(features, models.version,
+                                             lambda rows: self.predict_matrix(rows, models))
+    
     def predict_irrigation(self, input_data):
         """Predict irrigation need and amount"""
-        if not all([self.classifier, self.regressor, self.scaler]):
+        models = self.active_models()
+        if models is None or not models.ready:
             return self.fallback_prediction(input_data)
         
         try:
-            # Prepare features
             features = self.prepare_features(input_data)
-            features_scaled = self.scaler.transform(features)
-            
-            # Predict irrigation need
-            need_irrigation = self.classifier.predict(features_scaled)[0]
-            irrigation_probability = self.classifier.predict_proba(features_scaled)[0][1]
-            
-            # Predict irrigation amount if needed
-            irrigation_amount = 0
-            if need_irrigation:
-                irrigation_amount = max(0, self.regressor.predict(features_scaled)[0])
+            need_irrigation, irrigation_amount, irrigation_probability = self.predict_rows(features, models)
+            self.record_predictions(models.version)
             
             return {
-                'need_irrigation': bool(need_irrigation),
-                'irrigation_amount_mm': round(irrigation_amount, 1),
-                'confidence': round(irrigation_probability * 100, 1),
-                'method': 'ml_prediction'
+                'need_irrigation': bool(need_irrigation[0]),
+                'irrigation_amount_mm': round(float(irrigation_amount[0]), 1),
+                'confidence': round(float(irrigation_probability[0]) * 100, 1),
+                'method': 'ml_prediction',
+                'model_version': models.version
             }
             
         except Exception as e:
             print(f"ML prediction error: {e}")
             return self.fallback_prediction(input_data)
     
+    def prepare_feature_matrix(self, columns):
+        """
+        (n, 10) feature matrix from column arrays, one row per (farm, day).
+        columns holds the prepare_features inputs as equal-length arrays;
+        soil_type may be names or already-encoded integers.
+        """
+        temp_max = np.asarray(columns['temp_max'], dtype=np.float64)
+        temp_min = np.asarray(columns['temp_min'], dtype=np.float64)
+        soil_type = np.asarray(columns['soil_type'])
+        if soil_type.dtype.kind in 'iuf':
+            soil_encoded = soil_type.astype(np.float64)
+        else:
+            soil_encoded = np.array([SOIL_ENCODING.get(soil, 3) for soil in soil_type], dtype=np.float64)
+        
+        return np.column_stack([
+            np.asarray(columns['soil_moisture_percent'], dtype=np.float64),
+            temp_max,
+            temp_min,
+            (temp_max + temp_min) / 2,
+            np.asarray(columns['humidity'], dtype=np.float64),
+            np.asarray(columns['wind_speed'], dtype=np.float64),
+            np.asarray(columns['days_since_irrigation'], dtype=np.float64),
+            np.asarray(columns['growth_stage'], dtype=np.float64),
+            soil_encoded,
+            np.asarray(columns['day_of_year'], dtype=np.float64)
+        ])
+    
+    def predict_batch(self, features):
+        """
+        Predict need, amount and confidence for every row of an (n, 10)
+        feature matrix with one scaler call, one predict_proba call and one
+        regressor call over just the rows that need water.
+        Returns a dict of length-n arrays.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        models = self.active_models()
+        if models is None or not models.ready:
+            return self.fallback_prediction_batch(features)
+        
+        try:
+            need_irrigation, irrigation_amount, probability = self.predict_rows(features, models)
+            self.record_predictions(models.version, len(features))
+            
+            return {
+                'need_irrigation': need_irrigation,
+                'irrigation_amount_mm': np.round(irrigation_amount, 1),
+                'confidence': np.round(probability * 100, 1),
+                'method': 'ml_prediction',
+                'model_version': models.version
+            }
+            
+        except Exception as e:
+            print(f"ML batch prediction error: {e}")
+            return self.fallback_prediction_batch(features)
+    
+    def fallback_prediction_batch(self, features):
+        """Vectorized fallback_prediction over a feature matrix"""
+        soil_moisture = features[:, 0]
+        need_irrigation = soil_moisture < 40
+        self.record_predictions(FALLBACK_VERSION, len(features))
+        return {
+            'need_irrigation': need_irrigation,
+            'irrigation_amount_mm': np.round(np.where(need_irrigation, (80 - soil_moisture) * 0.5, 0.0), 1),
+            'confidence': np.full(len(features), 75.0),
+            'method': 'rule_based_fallback',
+            'model_version': FALLBACK_VERSION
+        }
+    
     def fallback_prediction(self, data):
         """Simple rule-based fallback when ML models unavailable"""
         # Simple threshold-based approach
@@ -90,22 +247,11 @@ class IrrigationMLPredictor:
             deficit = target_moisture - data['soil_moisture_percent']
             irrigation_amount = deficit * 0.5  # Simple conversion factor
         
+        self.record_predictions(FALLBACK_VERSION)
         return {
             'need_irrigation': need_irrigation,
             'irrigation_amount_mm': round(irrigation_amount, 1),
             'confidence': 75.0,
-            'method': 'rule_based_fallback'
+            'method': 'rule_based_fallback',
+            'model_version': FALLBACK_VERSION
         }
-    def load_models(self):
-        """Load pre-trained models"""
-        model_dir = 'ml_models'
-        try:
-            print(f"Looking for models in: {os.path.abspath(model_dir)}")
-            self.classifier = joblib.load(f'{model_dir}/irrigation_classifier.pkl')
-            self.regressor = joblib.load(f'{model_dir}/irrigation_regressor.pkl')
-            self.scaler = joblib.load(f'{model_dir}/feature_scaler.pkl')
-            print("ML models loaded successfully")
-        except FileNotFoundError as e:
-            print(f"ML models not found: {e}. Using fallback calculations.")
-        except Exception as e:
-            print(f"Error loading ML models: {e}. Using fallback calculations.")
@@ -0,0 +1,276 @@
+"""
+Versioned store for the irrigation ML models.
+
+Layout under the registry root (ML_MODEL_DIR, default backend/ml_models):
+
+    versions/<version>/manifest.json   version, feature list, sha256 per file,
+                                       source pickle digest per compiled file
+    versions/<version>/*.pkl, *.npz    artifacts
+    CURRENT                            name of the active version
+
+A version directory is written under a temporary name and renamed into
+place once complete, and CURRENT is switched with os.replace, so readers
+only ever see a whole version. A root with no CURRENT but the flat files
+shipped with the repo loads as version 'legacy'.
+
+Artifacts are memory-mapped where the format allows: compiled .npz forests
+map their node arrays directly, and joblib pickles load with mmap_mode='r'
+(sklearn trees copy their nodes on unpickling, so only the compiled form
+shares pages between forked workers). When a version has both, the
+pickles are only loaded once a batch large enough to need them arrives.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+import joblib
+
+from models.compiled_forest import CompiledForest
+
+DEFAULT_MODEL_DIR = os.getenv(
+    'ML_MODEL_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_models')
+)
+LEGACY_VERSION = 'legacy'
+PICKLE_FILES = {
+    'classifier': 'irrigation_classifier.pkl',
+    'regressor': 'irrigation_regressor.pkl',
+    'scaler': 'feature_scaler.pkl'
+}
+COMPILED_FILES = {
+    'compiled_classifier': 'irrigation_classifier.npz',
+    'compiled_regressor': 'irrigation_regressor.npz'
+}
+# Pickles each compiled forest is built from (the scaler is folded in)
+COMPILED_SOURCES = {
+    'compiled_classifier': ('irrigation_classifier.pkl', 'feature_scaler.pkl'),
+    'compiled_regressor': ('irrigation_regressor.pkl', 'feature_scaler.pkl')
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sources_sha256(directory, key):
+    """Digest of the pickles a compiled forest is built from, or None if any is missing"""
+    paths = [os.path.join(directory, name) for name in COMPILED_SOURCES[key]]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return hashlib.sha256(':'.join(file_sha256(path) for path in paths).encode()).hexdigest()
+
+
+class LoadedModels:
+    """One version's artifacts; the predictor swaps whole instances on reload"""
+
+    def __init__(self, version, manifest=None, directory=None, mmap=True):
+        self.version = version
+        self.manifest = manifest or {}
+        self.directory = directory
+        self.mmap = mmap
+        self.pickle_lock = threading.Lock()
+        self.pickles_unavailable = False
+        self.loaded_at = datetime.now()
+        self.classifier = None
+        self.regressor = None
+        self.scaler = None
+        self.compiled_classifier = None
+        self.compiled_regressor = None
+
+    @property
+    def feature_names(self):
+        return self.manifest.get('feature_names')
+
+    @property
+    def compiled(self):
+        return self.compiled_classifier is not None and self.compiled_regressor is not None
+
+    @property
+    def ready(self):
+        return self.compiled or all([self.classifier, self.regressor, self.scaler])
+
+    def sklearn_models(self):
+        """
+        (classifier, regressor, scaler), loading the pickles on first use
+        when only the compiled forests were loaded. None if the pickles are
+        missing or no longer the ones the compiled forests were built from.
+        """
+        if self.classifier is None and self.compiled and self.directory and not self.pickles_unavailable:
+            with self.pickle_lock:
+                if self.classifier is None and not self.pickles_unavailable:
+                    self.pickles_unavailable = not self.load_pickles()
+        if self.classifier is None:
+            return None
+        return self.classifier, self.regressor, self.scaler
+
+    def load_pickles(self):
+        """Load the pickles beside the compiled forests; False if they are missing or changed"""
+        for key, forest in (('compiled_classifier', self.compiled_classifier),
+                            ('compiled_regressor', self.compiled_regressor)):
+            if sources_sha256(self.directory, key) != forest.source_sha256:
+                print(f"Model version {self.version}: pickles missing or changed since compiling, "
+                      f"staying on the compiled forests")
+                return False
+        loaded = {key: joblib.load(os.path.join(self.directory, name), mmap_mode='r' if self.mmap else None)
+                  for key, name in PICKLE_FILES.items()}
+        # The classifier goes last: other threads check it without the lock
+        self.scaler, self.regressor = loaded['scaler'], loaded['regressor']
+        self.classifier = loaded['classifier']
+        return True
+
+
+class ModelRegistry:
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_MODEL_DIR
+        self.versions_dir = os.path.join(self.root, 'versions')
+        self.current_path = os.path.join(self.root, 'CURRENT')
+
+    def versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir)
+                      if os.path.exists(os.path.join(self.versions_dir, name, 'manifest.json')))
+
+    def current_version(self):
+        """Active version name, 'legacy' for the flat shipped files, or None"""
+        try:
+            with open(self.current_path) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        if os.path.exists(os.path.join(self.root, PICKLE_FILES['classifier'])) or \
+                os.path.exists(os.path.join(self.root, COMPILED_FILES['compiled_classifier'])):
+            return LEGACY_VERSION
+        return None
+
+    def version_dir(self, version):
+        if version == LEGACY_VERSION:
+            return self.root
+        if not version or os.sep in version or version.startswith('.'):
+            raise ValueError(f"Invalid model version '{version}'")
+        return os.path.join(self.versions_dir, version)
+
+    def read_manifest(self, version):
+        if version == LEGACY_VERSION:
+            return {'version': LEGACY_VERSION}
+        with open(os.path.join(self.version_dir(version), 'manifest.json')) as f:
+            return json.load(f)
+
+    def verify(self, version, manifest):
+        """Raise ValueError if any artifact's checksum differs from the manifest"""
+        directory = self.version_dir(version)
+        for name, entry in manifest.get('files', {}).items():
+            actual = file_sha256(os.path.join(directory, name))
+            if actual != entry['sha256']:
+                raise ValueError(f"Model version {version}: checksum mismatch for {name}")
+
+    def load(self, version=None, mmap=True):
+        """
+        Load a version (default: the current one), verifying checksums first.
+        Compiled forests are loaded instead of the pickles when both exist and
+        were built from those pickles; stale ones are ignored.
+        """
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No ML models in {self.root}")
+        manifest = self.read_manifest(version)
+        self.verify(version, manifest)
+
+        directory = self.version_dir(version)
+        models = LoadedModels(version, manifest, directory, mmap)
+        compiled_paths = {key: os.path.join(directory, name) for key, name in COMPILED_FILES.items()}
+        if all(os.path.exists(path) for path in compiled_paths.values()):
+            compiled = {key: CompiledForest.load(path, mmap=mmap) for key, path in compiled_paths.items()}
+            stale = [COMPILED_FILES[key] for key, forest in compiled.items()
+                     if not self.compiled_matches(directory, key, forest)]
+            if not stale:
+                for key, forest in compiled.items():
+                    setattr(models, key, forest)
+                return models
+            print(f"Model version {version}: {', '.join(stale)} not built from the current pickles, "
+                  f"loading the pickles instead")
+
+        for key, name in PICKLE_FILES.items():
+            setattr(models, key, joblib.load(os.path.join(directory, name), mmap_mode='r' if mmap else None))
+        return models
+
+    def compiled_matches(self, directory, key, forest):
+        """True if forest was compiled from the pickles in directory, or there are none to compare"""
+        expected = sources_sha256(directory, key)
+        return expected is None or forest.source_sha256 == expected
+
+    def publish(self, source_dir, version=None, feature_names=None, metadata=None, activate=True):
+        """
+        Copy the artifacts in source_dir into a new version directory with a
+        manifest, and make it current unless activate is False. Compiled
+        forests are only copied if they were built from the pickles beside
+        them; the manifest records the source digest of each one.
+        """
+        version = version or datetime.now().strftime('v%Y%m%d-%H%M%S')
+        target = self.version_dir(version)
+        if os.path.exists(target):
+            raise ValueError(f"Model version {version} already exists")
+
+        names = [name for name in PICKLE_FILES.values() if os.path.exists(os.path.join(source_dir, name))]
+        compiled_from = {}
+        for key, name in COMPILED_FILES.items():
+            path = os.path.join(source_dir, name)
+            if not os.path.exists(path):
+                continue
+            forest = CompiledForest.load(path, mmap=True)
+            if not self.compiled_matches(source_dir, key, forest):
+                print(f"Skipping {name}: not built from the pickles in {source_dir}")
+                continue
+            names.append(name)
+            compiled_from[name] = forest.source_sha256
+        if not names:
+            raise FileNotFoundError(f"No model artifacts in {source_dir}")
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=self.versions_dir)
+        try:
+            files = {}
+            for name in names:
+                shutil.copyfile(os.path.join(source_dir, name), os.path.join(staging, name))
+                files[name] = {
+                    'sha256': file_sha256(os.path.join(staging, name)),
+                    'bytes': os.path.getsize(os.path.join(staging, name))
+                }
+            manifest = {
+                'version': version,
+                'created_at': datetime.now().isoformat(),
+                'feature_names': feature_names,
+                'files': files,
+                'compiled_from': compiled_from,
+                'metadata': metadata or {}
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        print(f"Published model version {version} ({len(names)} files)")
+        if activate:
+            self.activate(version)
+        return manifest
+
+    def activate(self, version):
+        """Point CURRENT at an existing version in one atomic rename"""
+        if version != LEGACY_VERSION:
+            self.read_manifest(version)
+        temp_path = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(version + '\n')
+        os.replace(temp_path, self.current_path)
+        print(f"Active model version: {version}")
@@ -0,0 +1,205 @@
+"""
+Soil and crop parameters compiled into integer-indexed arrays.
+
+The dict tables in data_models are validated once and turned into arrays:
+per-soil columns, per-crop columns, Kc by stage (crops x 4) and the
+soil x crop AWC matrix. Engines that work on many farms look parameters up
+by integer code instead of walking nested dicts.
+
+Regional crops and soils can be added without code changes by pointing
+CROP_PARAMETERS_FILE at a JSON or YAML file with any of the sections
+soil_types, crops, soil_thresholds and irrigation_triggers; its entries
+are merged field by field over the built-in tables, so an override can
+change a single value of an existing crop or soil.
+"""
+import copy
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from models.data_models import SOIL_TYPES, CROP_DATABASE, SOIL_THRESHOLDS, IRRIGATION_TRIGGERS
+
+KC_FIELDS = ['kc_initial', 'kc_development', 'kc_mid', 'kc_late']
+STAGE_PATTERN = re.compile(r'\((\d+)\s*-\s*\d+\s*days\)')
+
+
+class ParameterStore:
+    source = 'built-in'
+
+    def __init__(self, soil_types, crops, soil_thresholds, irrigation_triggers):
+        self.soil_types = soil_types
+        self.crops = crops
+        self.soil_thresholds = soil_thresholds
+        self.irrigation_triggers = irrigation_triggers
+        self.validate()
+
+        self.soil_names = list(soil_types)
+        self.crop_names = list(crops)
+        self.soil_index = {name: code for code, name in enumerate(self.soil_names)}
+        self.crop_index = {name: code for code, name in enumerate(self.crop_names)}
+
+        def soil_column(field):
+            return np.array([float(soil_types[name][field]) for name in self.soil_names])
+
+        def crop_column(field, default=None):
+            return np.array([float(crops[name].get(field, default)) for name in self.crop_names])
+
+        # Per soil (S,)
+        self.field_capacity = soil_column('field_capacity')
+        self.wilting_point = soil_column('wilting_point')
+        self.soil_threshold = np.array([float(soil_thresholds[name]) for name in self.soil_names])
+        self.irrigation_trigger = np.array([float(irrigation_triggers[name]) for name in self.soil_names])
+
+        # Per crop (C,) and (C, 4)
+        self.rooting_depth = crop_column('rooting_depth')
+        self.critical_depletion = crop_column('critical_depletion', 0.5)
+        self.stress_factor = crop_column('stress_factor', 1.0)
+        self.season_length = crop_column('season_length').astype(np.int64)
+        self.kc = np.array([[float(crops[name][field]) for field in KC_FIELDS] for name in self.crop_names])
+        self.stage_starts = np.array([self.parse_stage_starts(crops[name]) for name in self.crop_names])
+
+        # Soil x crop (S, C)
+        self.awc = ((self.field_capacity - self.wilting_point)[:, None] * self.rooting_depth[None, :] * 1000)
+        self.allowed_depletion = np.minimum(self.critical_depletion[None, :], self.soil_threshold[:, None])
+
+        for array in (self.field_capacity, self.wilting_point, self.soil_threshold, self.irrigation_trigger,
+                      self.rooting_depth, self.critical_depletion, self.stress_factor, self.season_length,
+                      self.kc, self.stage_starts, self.awc, self.allowed_depletion):
+            array.setflags(write=False)
+
+    def validate(self):
+        """Raise ValueError listing every inconsistent or missing parameter"""
+        problems = []
+
+        def number(table, name, field, low=None, high=None, required=True):
+            value = table[name].get(field)
+            if value is None:
+                if required:
+                    problems.append(f"{name}: missing {field}")
+                return None
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                problems.append(f"{name}: {field} must be a number, got {value!r}")
+                return None
+            if (low is not None and value < low) or (high is not None and value > high):
+                problems.append(f"{name}: {field}={value} outside [{low}, {high}]")
+            return value
+
+        for name in self.soil_types:
+            field_capacity = number(self.soil_types, name, 'field_capacity', 0, 1)
+            wilting_point = number(self.soil_types, name, 'wilting_point', 0, 1)
+            if field_capacity is not None and wilting_point is not None and field_capacity <= wilting_point:
+                problems.append(f"{name}: field_capacity must exceed wilting_point")
+            if name not in self.soil_thresholds:
+                problems.append(f"{name}: missing soil threshold")
+            if name not in self.irrigation_triggers:
+                problems.append(f"{name}: missing irrigation trigger")
+
+        for name in self.crops:
+            for field in KC_FIELDS:
+                number(self.crops, name, field, 0.05, 2.0)
+            number(self.crops, name, 'rooting_depth', 0.05, 5)
+            number(self.crops, name, 'critical_depletion', 0.05, 0.95, required=False)
+            number(self.crops, name, 'stress_factor', 0.1, 5, required=False)
+            number(self.crops, name, 'season_length', 1, 3650)
+
+        if not self.soil_types or not self.crops:
+            problems.append('at least one soil type and one crop are required')
+        if problems:
+            raise ValueError('Invalid crop/soil parameters: ' + '; '.join(problems))
+
+    @staticmethod
+    def parse_stage_starts(crop_data):
+        """First season day of each growth stage, parsed from '(0-15 days)' labels"""
+        starts = []
+        for label in crop_data.get('growth_stages', []):
+            match = STAGE_PATTERN.search(label)
+            if not match:
+                break
+            starts.append(int(match.group(1)))
+
+        if len(starts) == 4:
+            return starts
+        # Perennials list stages in years; split the season into equal quarters
+        season_length = int(crop_data['season_length'])
+        return [round(season_length * i / 4) for i in range(4)]
+
+    def soil_code(self, soil_type):
+        if soil_type not in self.soil_index:
+            raise KeyError(soil_type)
+        return self.soil_index[soil_type]
+
+    def crop_code(self, crop_name):
+        if crop_name not in self.crop_index:
+            raise KeyError(crop_name)
+        return self.crop_index[crop_name]
+
+    def stage_kc(self, crop_codes, growth_stages):
+        """Kc for stage indices 0-3; anything else falls back to mid-season"""
+        stages = np.asarray(growth_stages)
+        valid = np.isin(stages, [0, 1, 2, 3])
+        return self.kc[crop_codes, np.where(valid, stages, 2).astype(np.intp)]
+
+    def stats(self):
+        return {
+            'soils': len(self.soil_names),
+            'crops': len(self.crop_names),
+            'source': self.source
+        }
+
+    @classmethod
+    def from_tables(cls, overrides=None, source='built-in'):
+        """Built-in tables with optional {section: {name: entry}} overrides merged per field"""
+        tables = {
+            'soil_types': copy.deepcopy(SOIL_TYPES),
+            'crops': copy.deepcopy(CROP_DATABASE),
+            'soil_thresholds': dict(SOIL_THRESHOLDS),
+            'irrigation_triggers': dict(IRRIGATION_TRIGGERS)
+        }
+        for section, entries in (overrides or {}).items():
+            if section not in tables:
+                raise ValueError(f"Unknown parameter section '{section}'")
+            for name, entry in entries.items():
+                if isinstance(entry, dict) and isinstance(tables[section].get(name), dict):
+                    tables[section][name].update(entry)
+                else:
+                    tables[section][name] = entry
+
+        store = cls(**tables)
+        store.source = source
+        return store
+
+    @classmethod
+    def from_file(cls, path):
+        """Load overrides from a .json, .yaml or .yml file"""
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError('PyYAML is required to read YAML parameter files')
+                overrides = yaml.safe_load(f) or {}
+            else:
+                overrides = json.load(f)
+        return cls.from_tables(overrides, source=path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_parameter_store():
+    """Process-wide store, compiled on first use from CROP_PARAMETERS_FILE if set"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = os.getenv('CROP_PARAMETERS_FILE')
+                _store = ParameterStore.from_file(path) if path else ParameterStore.from_tables()
+                print(f"Parameter store: {len(_store.soil_names)} soils, {len(_store.crop_names)} crops "
+                      f"({_store.source})")
+    return _store
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Each day an irrigation stays deferred raises the farm's weight by this fraction
+DEFERRAL_WEIGHT_STEP = 0.5
+
+
+def water_fill(demand, capacity, weights):
+    """
+    Weighted max-min fair split of capacity over demand (1-D arrays).
+    Every farm gets min(demand, weight * level), with the level chosen so
+    the total equals capacity (or every demand is met). Sort-and-cumsum,
+    O(n log n) in the number of farms.
+    """
+    total = demand.sum()
+    if total <= capacity:
+        return demand.copy()
+    if capacity <= 0:
+        return np.zeros_like(demand)
+
+    # Farms fill up in order of demand / weight
+    ratio = demand / weights
+    order = np.argsort(ratio)
+    sorted_ratio = ratio[order]
+    filled = np.concatenate(([0.0], np.cumsum(demand[order])))
+    remaining_weight = weights.sum() - np.concatenate(([0.0], np.cumsum(weights[order])))
+
+    # Water used if the level sits at each farm's ratio
+    used_at = filled[:-1] + sorted_ratio * remaining_weight[:-1]
+    k = np.searchsorted(used_at, capacity)
+    level = (capacity - filled[k]) / remaining_weight[k]
+    return np.minimum(demand, weights * level)
+
+
+def allocate_water(demand, capacity, weights=None, deferral_step=DEFERRAL_WEIGHT_STEP):
+    """
+    Allocate a shared daily source across farms.
+    demand is (days, farms) liters, capacity is a scalar or (days,) liters,
+    weights are per-farm (higher means more drought sensitive). Demand that
+    cannot be met is deferred to the next day and competes with a weight
+    that grows with every day it waits. Only farms asking for water on a
+    day take part in that day's fill.
+    Returns (days, farms) allocated and deferred arrays plus the unmet
+    demand left after the last day.
+    """
+    demand = np.asarray(demand, dtype=np.float64)
+    days, farms = demand.shape
+    capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), (days,))
+    weights = np.ones(farms) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    allocated = np.zeros((days, farms))
+    deferred = np.zeros((days, farms))
+    backlog = np.zeros(farms)
+    waiting_days = np.zeros(farms)
+
+    for t in range(days):
+        want = demand[t] + backlog
+        active = np.flatnonzero(want > 0)
+        if active.size:
+            day_weights = weights[active] * (1 + deferral_step * waiting_days[active])
+            allocated[t, active] = water_fill(want[active], capacity[t], day_weights)
+
+        backlog = want - allocated[t]
+        backlog[backlog < 1e-9] = 0.0
+        deferred[t] = backlog
+        waiting_days = np.where(backlog > 0, waiting_days + 1, 0)
+
+    return {
+        'allocated': allocated,
+        'deferred': deferred,
+        'unmet': backlog
+    }
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Management Allowable Depletion (%) that triggers irrigation
+DEFAULT_MAD_PERCENT = 50
+# Irrigation refills the root zone to this fraction of AWC
+DEFAULT_REFILL_FRACTION = 0.8
+# Soil water at the start of a fresh simulation, as a fraction of AWC
+DEFAULT_INITIAL_FRACTION = 0.5
+
+
+def simulate_water_balance(rainfall, etc, awc, initial_moisture=None,
+                           mad_percent=DEFAULT_MAD_PERCENT,
+                           refill_fraction=DEFAULT_REFILL_FRACTION):
+    """
+    Daily root-zone water balance vectorized across farms.
+    rainfall and etc are (days, farms) arrays (a 1-D series is one column),
+    awc is (farms,). Days are walked in order; every farm advances together.
+    Returns (days, farms) arrays with the same values as the scalar loop.
+    """
+    etc = np.asarray(etc, dtype=np.float64)
+    if etc.ndim == 1:
+        etc = etc[:, None]
+    rainfall = np.asarray(rainfall, dtype=np.float64)
+    if rainfall.ndim == 1:
+        rainfall = rainfall[:, None]
+    rainfall = np.broadcast_to(rainfall, etc.shape)
+    awc = np.broadcast_to(np.asarray(awc, dtype=np.float64), etc.shape[1:])
+
+    if initial_moisture is None:
+        soil_moisture = awc * DEFAULT_INITIAL_FRACTION
+    else:
+        soil_moisture = np.broadcast_to(np.asarray(initial_moisture, dtype=np.float64), awc.shape)
+
+    days = etc.shape[0]
+    moisture_out = np.empty(etc.shape)
+    percent_out = np.empty(etc.shape)
+    depletion_out = np.empty(etc.shape)
+    needed_out = np.empty(etc.shape, dtype=bool)
+    amount_out = np.empty(etc.shape)
+
+    target_moisture = awc * refill_fraction
+
+    for i in range(days):
+        soil_moisture = soil_moisture + rainfall[i]
+        soil_moisture = soil_moisture - etc[i]
+        soil_moisture = np.maximum(0, np.minimum(soil_moisture, awc))
+
+        depletion_percent = 100 - (soil_moisture / awc) * 100
+        irrigation_needed = depletion_percent > mad_percent
+
+        # Refill to target only where depletion crossed the MAD threshold
+        irrigation_amount = np.where(irrigation_needed, target_moisture - soil_moisture, 0.0)
+        soil_moisture = np.where(irrigation_needed, target_moisture, soil_moisture)
+        soil_moisture = np.maximum(0, np.minimum(soil_moisture, awc))
+
+        moisture_out[i] = soil_moisture
+        percent_out[i] = (soil_moisture / awc) * 100
+        depletion_out[i] = depletion_percent
+        needed_out[i] = irrigation_needed
+        amount_out[i] = irrigation_amount
+
+    return {
+        'soil_moisture': moisture_out,
+        'soil_moisture_percent': percent_out,
+        'depletion_percent': depletion_out,
+        'irrigation_needed': needed_out,
+        'irrigation_amount': amount_out
+    }
@@ -0,0 +1,89 @@
+import numpy as np
+
+from models.et_engine import penman_monteith_et0
+from models.water_balance import simulate_water_balance
+
+DEFAULT_MEMBERS = 500
+
+# Forecast error (1 sigma) on day one; temperature error grows with lead time.
+# Scales sit a little under the noise get_fallback_weather_data adds to regional
+# normals, since members are centred on a real forecast.
+TEMP_SIGMA = 1.0
+TEMP_SIGMA_PER_DAY = 0.25
+HUMIDITY_SIGMA = 8.0
+WIND_SIGMA = 1.5
+SOLAR_SIGMA = 2.5
+# Rain amounts are multiplied by a mean-one lognormal factor; dry days stay dry
+RAIN_LOG_SIGMA = 0.5
+
+PERCENTILES = (10, 50, 90)
+
+
+def perturb_weather(weather_arrays, rainfall, members=DEFAULT_MEMBERS, rng=None):
+    """
+    Draw ensemble members around one forecast.
+    weather_arrays holds (days,) columns as returned by weather_to_arrays.
+    Returns (days, members) columns, ready for penman_monteith_et0 and
+    simulate_water_balance (members take the place of farms).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    days = len(rainfall)
+    shape = (days, members)
+    lead_sigma = (TEMP_SIGMA + TEMP_SIGMA_PER_DAY * np.arange(days))[:, None]
+
+    # Daily max and min share most of their error
+    temp_error = rng.normal(0, 1, shape) * lead_sigma
+    temp_max = weather_arrays['temp_max'][:, None] + temp_error
+    temp_min = weather_arrays['temp_min'][:, None] + 0.8 * temp_error + rng.normal(0, 0.5, shape)
+    temp_min = np.minimum(temp_min, temp_max - 1)
+
+    humidity = np.clip(weather_arrays['humidity'][:, None] + rng.normal(0, HUMIDITY_SIGMA, shape), 10, 100)
+    wind_speed = np.maximum(0, weather_arrays['wind_speed'][:, None] + rng.normal(0, WIND_SIGMA, shape))
+    solar_radiation = np.maximum(5, weather_arrays['solar_radiation'][:, None] + rng.normal(0, SOLAR_SIGMA, shape))
+
+    # mu = -sigma^2 / 2 keeps the expected rain equal to the forecast
+    rain_factor = rng.lognormal(-RAIN_LOG_SIGMA ** 2 / 2, RAIN_LOG_SIGMA, shape)
+    rain = np.asarray(rainfall, dtype=np.float64)[:, None] * rain_factor
+
+    return {
+        'temp_max': temp_max,
+        'temp_min': temp_min,
+        'humidity': humidity,
+        'wind_speed': wind_speed,
+        'solar_radiation': solar_radiation,
+        'rainfall': rain
+    }
+
+
+def run_ensemble(weather_arrays, rainfall, kc, awc, farm_area, members=DEFAULT_MEMBERS,
+                 initial_moisture=None, seed=None):
+    """
+    Run every member through ET0, ETc and the water balance in one pass.
+    Returns per-day irrigation probability and P10/P50/P90 of the irrigation
+    amount (mm) and volume (liters), plus percentiles of the 7-day total.
+    """
+    rng = np.random.default_rng(seed)
+    ensemble = perturb_weather(weather_arrays, rainfall, members, rng)
+
+    et0 = penman_monteith_et0(ensemble['temp_max'], ensemble['temp_min'], ensemble['humidity'],
+                              ensemble['wind_speed'], ensemble['solar_radiation'])
+    etc = et0 * kc
+    balance = simulate_water_balance(
+        ensemble['rainfall'], etc, np.full(members, awc), initial_moisture=initial_moisture
+    )
+
+    amount = balance['irrigation_amount']
+    liters_per_mm = farm_area * 10
+    amount_pct = np.percentile(amount, PERCENTILES, axis=1)
+    total_pct = np.percentile(amount.sum(axis=0), PERCENTILES)
+
+    return {
+        'members': members,
+        'irrigation_probability': balance['irrigation_needed'].mean(axis=1),
+        'amount_mm': amount_pct,
+        'amount_liters': amount_pct * liters_per_mm,
+        'total_mm': total_pct,
+        'total_liters': total_pct * liters_per_mm,
+        'et0_mean': et0.mean(axis=1),
+        'soil_moisture_percent_p50': np.percentile(balance['soil_moisture_percent'], 50, axis=1)
+    }
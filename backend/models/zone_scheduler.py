@@ -0,0 +1,129 @@
+import heapq
+import re
+
+DEFAULT_WINDOWS = ['06:00-08:00', '17:00-19:00']
+# Don't start a zone with less than this much window left
+MIN_SLOT_MINUTES = 10
+
+
+def parse_window(window):
+    """'06:00-08:00' -> (360, 480) minutes after midnight"""
+    match = re.fullmatch(r'\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*', str(window))
+    if not match:
+        raise ValueError(f"Invalid time window '{window}', expected HH:MM-HH:MM")
+    start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+    start, end = start_h * 60 + start_m, end_h * 60 + end_m
+    if not (0 <= start < end <= 24 * 60) or start_m > 59 or end_m > 59:
+        raise ValueError(f"Invalid time window '{window}'")
+    return start, end
+
+
+def parse_windows(windows):
+    """Sorted, non-overlapping windows in minutes"""
+    parsed = sorted(parse_window(window) for window in windows)
+    for (_, previous_end), (start, _) in zip(parsed, parsed[1:]):
+        if start < previous_end:
+            raise ValueError('Time windows must not overlap')
+    return parsed
+
+
+def format_minutes(minutes):
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def job_priority(job):
+    """Heap key: work carried over from an earlier day first, then most urgent"""
+    return (not job.get('carried_over', False), -job['urgency'])
+
+
+def pack_day(jobs, pump_flow_lph, windows, min_slot_minutes=MIN_SLOT_MINUTES):
+    """
+    Assign one day's irrigation jobs to pump time slots.
+    jobs are dicts with zone_id, liters, flow_lph, urgency and optionally
+    carried_over. Zones start strictly in order of urgency, as soon as enough
+    pump capacity is free;
+    several zones run together while their flows fit within pump_flow_lph.
+    A zone still running at the end of a window is cut there and resumes,
+    ahead of less urgent zones, in the next window.
+    Returns (slots, unfinished jobs).
+    """
+    queue = []
+    for seq, job in enumerate(jobs):
+        heapq.heappush(queue, (job_priority(job), seq, job))
+    seq = len(jobs)
+    slots = []
+
+    for window_start, window_end in windows:
+        now = window_start
+        free = pump_flow_lph
+        running = []    # (end minute, seq, flow)
+        cut = []
+
+        while queue:
+            # Start zones in urgency order while capacity and time allow
+            while queue and window_end - now >= min_slot_minutes:
+                job = queue[0][2]
+                flow = min(job['flow_lph'], pump_flow_lph)
+                if flow > free + 1e-9:
+                    break
+                heapq.heappop(queue)
+
+                finish = now + job['liters'] / flow * 60
+                end = min(finish, window_end)
+                delivered = job['liters'] if finish <= window_end else flow * (end - now) / 60
+                slots.append({
+                    'zone_id': job['zone_id'],
+                    'start_minute': now,
+                    'end_minute': end,
+                    'flow_lph': flow,
+                    'liters': delivered
+                })
+                if finish > window_end:
+                    cut.append({**job, 'liters': job['liters'] - delivered})
+
+                heapq.heappush(running, (end, seq, flow))
+                seq += 1
+                free -= flow
+
+            if not running or window_end - now < min_slot_minutes:
+                break
+            # Advance to the next zone finishing and release its flow
+            now, _, flow = heapq.heappop(running)
+            free += flow
+            while running and running[0][0] <= now:
+                free += heapq.heappop(running)[2]
+
+        for job in cut:
+            heapq.heappush(queue, (job_priority(job), seq, job))
+            seq += 1
+
+    unfinished = [job for _, _, job in sorted(queue)]
+    return slots, unfinished
+
+
+def schedule_zones(jobs_by_day, pump_flow_lph, windows=DEFAULT_WINDOWS, min_slot_minutes=MIN_SLOT_MINUTES):
+    """
+    Pack irrigation jobs day by day. jobs_by_day is a list of (date, jobs),
+    every job with a positive flow_lph;
+    work left over at the end of a day is carried into the next day ahead
+    of that day's new jobs. Returns (slots with dates, jobs never scheduled).
+    """
+    if pump_flow_lph <= 0:
+        raise ValueError('pump_flow_lph must be positive')
+    for _, jobs in jobs_by_day:
+        for job in jobs:
+            if job['flow_lph'] <= 0:
+                raise ValueError(f"Zone {job['zone_id']} needs a positive flow_lph")
+    parsed = parse_windows(windows)
+
+    slots = []
+    carried = []
+    for date, jobs in jobs_by_day:
+        day_slots, unfinished = pack_day(carried + list(jobs), pump_flow_lph, parsed, min_slot_minutes)
+        for slot in day_slots:
+            slot['date'] = date
+        slots.extend(day_slots)
+        carried = [{**job, 'carried_over': True} for job in unfinished]
+
+    return slots, carried
@@ -1,5 +1,6 @@
 import requests
 import json
+import sys
 
 def test_backend():
     base_url = "http://localhost:5000"
@@ -30,5 +31,149 @@ def test_backend():
         print(f"Schedule generated with {len(data['schedule'])} days")
         print(f"ML confidence: {data['schedule'][0].get('ml_confidence', 'N/A')}")
 
+def test_prediction_cache(samples=2000, max_amount_error_mm=1.0, min_agreement=0.95):
+    """Quantized cache predictions stay close to uncached ones (runs without the server)"""
+    # Imported here so the HTTP checks only need requests
+    import numpy as np
+    from models.ml_predictor import IrrigationMLPredictor
+    from utils.prediction_cache import PredictionCache
+
+    uncached = IrrigationMLPredictor()
+    uncached.prediction_cache = None
+    cached = IrrigationMLPredictor(prediction_cache=PredictionCache(uncached.feature_names))
+    
+    rng = np.random.default_rng(7)
+    soil_types = ['Sandy', 'Clay', 'Loam', 'Sandy Loam']
+    inputs = [{
+        'soil_moisture_percent': rng.uniform(15, 90),
+        'temp_max': rng.uniform(25, 42),
+        'temp_min': rng.uniform(12, 26),
+        'humidity': rng.uniform(20, 95),
+        'wind_speed': rng.uniform(0, 8),
+        'days_since_irrigation': int(rng.integers(0, 11)),
+        'growth_stage': int(rng.integers(0, 4)),
+        'soil_type': soil_types[rng.integers(0, 4)],
+        'day_of_year': int(rng.integers(1, 366))
+    } for _ in range(samples)]
+    
+    agreements = 0
+    amount_errors = []
+    for data in inputs + inputs:
+        expected = uncached.predict_irrigation(data)
+        actual = cached.predict_irrigation(data)
+        agreements += expected['need_irrigation'] == actual['need_irrigation']
+        amount_errors.append(abs(expected['irrigation_amount_mm'] - actual['irrigation_amount_mm']))
+    
+    agreement = agreements / (2 * samples)
+    mean_error = float(np.mean(amount_errors))
+    stats = cached.stats()['prediction_cache']
+    print(f"Prediction cache test: agreement {agreement:.3f}, mean amount error {mean_error:.2f} mm, "
+          f"hit rate {stats['hit_rate']}")
+    
+    assert agreement >= min_agreement, f"Cached need prediction agrees on only {agreement:.1%} of inputs"
+    assert mean_error <= max_amount_error_mm, f"Cached amounts are off by {mean_error:.2f} mm on average"
+    assert stats['hits'] >= samples, "Repeated inputs should be served from the cache"
+
+def test_weather_cache_grid():
+    """Nearby GPS farms share one weather cache entry (runs without the server)"""
+    import os
+    import tempfile
+    os.environ.setdefault('WEATHER_API_KEY', 'offline-test-weather-api-key')
+    os.environ['WEATHER_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'weather_cache.db')
+    from models.irrigation_calculator import IrrigationCalculator
+    
+    calculator = IrrigationCalculator()
+    client = calculator.weather_client
+    upstream = []
+    client.fetch_weather_data = lambda location_str, days=7, **kwargs: (
+        upstream.append(location_str) or client.get_fallback_weather_data(days, location_str)
+    )
+    
+    # Both snap to the same 0.1 degree cell; the addresses differ
+    farms = [
+        {'address': 'GPS: 12.3456, 77.1234', 'latitude': '12.345600', 'longitude': '77.123400'},
+        {'address': 'GPS: 12.3312, 77.1198', 'latitude': '12.331200', 'longitude': '77.119800'}
+    ]
+    first, second = (calculator.get_weather_data(location) for location in farms)
+    stats = client.cache.stats()
+    print(f"Weather cache test: {len(upstream)} upstream call(s), {stats['hits']} hit(s), {stats['misses']} miss(es)")
+    
+    assert upstream == ['12.3456,77.1234'], f"Expected one upstream fetch, got {upstream}"
+    assert first == second, "Nearby farms should get the same cached forecast"
+    assert (stats['hits'], stats['misses']) == (1, 1), "Each lookup should be counted once"
+
+def exhaustive_plan_cost(rainfall, etc, awc, floor, initial, water_cost, pump_cost, min_event_mm):
+    """Cheapest plan over every set of irrigation days, each event applying the least water that holds the floor"""
+    import itertools
+    days = len(etc)
+    
+    def step(soil, t):
+        return min(max(soil + rainfall[t] - etc[t], 0.0), awc)
+    
+    best = float('inf')
+    for events in itertools.product([False, True], repeat=days):
+        soil, cost = initial, 0.0
+        for t in range(days):
+            if events[t]:
+                until = next((u for u in range(t + 1, days) if events[u]), days)
+                
+                def holds(amount):
+                    level = soil + amount
+                    for u in range(t, until):
+                        level = step(level, u)
+                        if level < floor - 1e-9:
+                            return False
+                    return True
+                
+                low, high = 0.0, awc - soil
+                if high < min_event_mm or not holds(high):
+                    break
+                for _ in range(60):
+                    middle = (low + high) / 2
+                    low, high = (low, middle) if holds(middle) else (middle, high)
+                amount = max(high, min_event_mm)
+                soil += amount
+                cost += pump_cost + water_cost * amount
+            soil = step(soil, t)
+            if soil < floor - 1e-9:
+                break
+        else:
+            best = min(best, cost)
+    return best
+
+def test_optimizer_exhaustive(farms=60, days=7, max_gap=5.0):
+    """DP plans stay close to exhaustive search and never pump less than the minimum event (runs without the server)"""
+    import numpy as np
+    from models.irrigation_optimizer import optimize_irrigation, DEFAULT_MIN_EVENT_MM
+    
+    rng = np.random.default_rng(3)
+    awc = rng.uniform(60, 160, farms)
+    max_depletion = rng.uniform(0.3, 0.6, farms)
+    initial = awc * 0.5
+    etc = rng.uniform(3, 9, (days, farms))
+    rainfall = np.where(rng.random((days, farms)) < 0.25, rng.uniform(0, 25, (days, farms)), 0.0)
+    plan = optimize_irrigation(rainfall, etc, awc, max_depletion, initial_moisture=initial)
+    
+    gaps = []
+    for farm in range(farms):
+        best = exhaustive_plan_cost(rainfall[:, farm], etc[:, farm], awc[farm], plan['floor'][farm],
+                                    initial[farm], 1.0, 10.0, DEFAULT_MIN_EVENT_MM)
+        if best < float('inf'):
+            assert plan['stress_days'][farm] == 0, f"Farm {farm}: stress although a feasible plan exists"
+            gaps.append(plan['total_cost'][farm] - best)
+    events = plan['irrigation_amount'][plan['irrigation_amount'] > 0]
+    print(f"Optimizer test: {len(gaps)} farms, cost gap to exhaustive search max {max(gaps):.2f}, "
+          f"mean {np.mean(gaps):.2f}; smallest event {events.min():.2f} mm")
+    
+    assert max(gaps) <= max_gap, f"DP plan costs {max(gaps):.2f} more than the exhaustive optimum"
+    assert events.min() >= DEFAULT_MIN_EVENT_MM - 1e-9, f"Irrigation event of only {events.min():.2f} mm"
+
 if __name__ == "__main__":
-    test_backend()
+    if '--prediction-cache' in sys.argv:
+        test_prediction_cache()
+    elif '--weather-cache' in sys.argv:
+        test_weather_cache_grid()
+    elif '--optimizer' in sys.argv:
+        test_optimizer_exhaustive()
+    else:
+        test_backend()
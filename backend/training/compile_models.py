@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.compiled_forest import CompiledForest
+from models.model_registry import COMPILED_FILES, sources_sha256
+
+# Rough ranges of the generated training data, in FEATURE_COLUMNS order
+CHECK_RANGES = [(10, 90), (20, 45), (10, 30), (15, 38), (20, 95), (0, 10), (0, 10), (0, 3), (1, 4), (1, 365)]
+
+
+def check_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(low, high, n) for low, high in CHECK_RANGES])
+    X[:, 3] = (X[:, 1] + X[:, 2]) / 2
+    X[:, 6:] = np.rint(X[:, 6:])
+    return X
+
+
+def reference_proba(classifier, X_scaled):
+    """Forest probability as the mean of per-tree class fractions"""
+    estimators = getattr(classifier, 'estimators_', [classifier])
+    total = 0
+    for estimator in estimators:
+        counts = estimator.tree_.value[estimator.apply(X_scaled.astype(np.float32)), 0, :]
+        total = total + counts / counts.sum(axis=1, keepdims=True)
+    return total / len(estimators)
+
+
+def compile_models(model_dir='../ml_models', check_samples=20000, seed=0):
+    """
+    Compile the pickled classifier/regressor (with the feature scaler folded
+    in) into .npz node arrays next to them, then check the compiled models
+    against sklearn on random rows. Each .npz records the sha256 of its
+    source pickles; the registry loads it in preference to the pickles only
+    while they still match.
+    """
+    scaler = joblib.load(os.path.join(model_dir, 'feature_scaler.pkl'))
+    X = check_rows(check_samples, seed)
+    X_scaled = scaler.transform(X)
+
+    for key, filename in COMPILED_FILES.items():
+        name = os.path.splitext(filename)[0]
+        model = joblib.load(os.path.join(model_dir, f'{name}.pkl'))
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        compiled.source_sha256 = sources_sha256(model_dir, key)
+
+        if compiled.is_classifier:
+            difference = np.abs(compiled.predict_proba(X) - reference_proba(model, X_scaled)).max()
+        else:
+            difference = np.abs(compiled.predict(X) - model.predict(X_scaled)).max()
+        if difference > 1e-9:
+            raise ValueError(f"{name}: compiled predictions differ from sklearn by {difference}")
+
+        path = os.path.join(model_dir, filename)
+        compiled.save(path)
+
+        row = X[:1]
+        started = time.perf_counter()
+        for _ in range(1000):
+            compiled.predict(row)
+        single_row_us = (time.perf_counter() - started) * 1000
+
+        print(f"{name}: {compiled.n_trees} trees, {len(compiled.feature)} nodes, depth {compiled.max_depth}, "
+              f"{compiled.nbytes / 1024:.0f} KiB in memory, {os.path.getsize(path) / 1024:.0f} KiB on disk, "
+              f"{single_row_us:.0f} us per row, max difference {difference:.2e}")
+
+    print(f"Compiled models saved to {os.path.abspath(model_dir)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compile the irrigation forests into flat node arrays')
+    parser.add_argument('--model-dir', default='../ml_models')
+    parser.add_argument('--check-samples', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    compile_models(args.model_dir, args.check_samples, args.seed)
@@ -2,6 +2,21 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
+import argparse
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SOIL_TYPES = np.array(['Sandy', 'Clay', 'Loam', 'Sandy Loam'])
+SOIL_ENCODING = np.array([1, 2, 3, 4])
+SOIL_RETENTION = np.array([0.7, 1.3, 1.0, 0.85])
+SOIL_IRRIGATION_THRESHOLD = np.array([45, 35, 40, 42])
+
+COLUMNS = ['soil_moisture_percent', 'temp_max', 'temp_min', 'temp_avg', 'humidity', 'wind_speed',
+           'days_since_irrigation', 'growth_stage', 'soil_type', 'soil_type_encoded', 'day_of_year',
+           'need_irrigation', 'irrigation_amount_mm']
 
 def generate_synthetic_irrigation_data(n_samples=5000):
     """Generate synthetic training data for irrigation prediction"""
@@ -71,12 +86,140 @@ def generate_synthetic_irrigation_data(n_samples=5000):
     
     return pd.DataFrame(data)
 
+def generate_chunk(n_samples, seed):
+    """
+    Vectorized version of generate_synthetic_irrigation_data: same columns,
+    dtypes and distributions, drawn from one numpy Generator per chunk.
+    seed may be an int or a np.random.SeedSequence.
+    """
+    rng = np.random.default_rng(seed)
+    
+    day_of_year = rng.integers(1, 366, n_samples)
+    season_factor = np.sin(2 * np.pi * day_of_year / 365)
+    
+    temp_max = 25 + 10 * season_factor + rng.normal(0, 5, n_samples)
+    temp_min = temp_max - rng.uniform(8, 15, n_samples)
+    temp_avg = (temp_max + temp_min) / 2
+    
+    humidity = np.clip(60 + rng.normal(0, 15, n_samples), 20, 95)
+    wind_speed = rng.exponential(2, n_samples)
+    
+    soil = rng.integers(0, len(SOIL_TYPES), n_samples)
+    growth_stage = rng.integers(0, 4, n_samples)
+    days_since_irrigation = rng.integers(0, 11, n_samples)
+    
+    moisture_loss = (temp_avg - 20) * 0.5 + days_since_irrigation * 3
+    soil_moisture = np.maximum(10, 70 - moisture_loss * SOIL_RETENTION[soil] + rng.normal(0, 5, n_samples))
+    
+    irrigation_threshold = SOIL_IRRIGATION_THRESHOLD[soil]
+    need_irrigation = soil_moisture < irrigation_threshold
+    moisture_deficit = irrigation_threshold + 25 - soil_moisture
+    irrigation_amount = np.where(
+        need_irrigation,
+        np.maximum(5, moisture_deficit * 0.6 + rng.normal(0, 2, n_samples)),
+        0.0
+    )
+    
+    return pd.DataFrame({
+        'soil_moisture_percent': soil_moisture.round(1),
+        'temp_max': temp_max.round(1),
+        'temp_min': temp_min.round(1),
+        'temp_avg': temp_avg.round(1),
+        'humidity': humidity.round(1),
+        'wind_speed': wind_speed.round(1),
+        'days_since_irrigation': days_since_irrigation,
+        'growth_stage': growth_stage,
+        'soil_type': SOIL_TYPES[soil],
+        'soil_type_encoded': SOIL_ENCODING[soil],
+        'day_of_year': day_of_year,
+        'need_irrigation': need_irrigation,
+        'irrigation_amount_mm': irrigation_amount.round(1)
+    }, columns=COLUMNS)
+
+def parquet_available():
+    return any(importlib.util.find_spec(engine) for engine in ('pyarrow', 'fastparquet'))
+
+def write_shard(df, path, fmt):
+    """Write one chunk as .parquet, .npz (one array per column) or .csv"""
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'npz':
+        arrays = {column: df[column].to_numpy() for column in df.columns}
+        # Strings as fixed-width unicode so shards load without pickle
+        arrays = {column: values.astype(str) if values.dtype == object else values
+                  for column, values in arrays.items()}
+        np.savez(path, **arrays)
+    else:
+        df.to_csv(path, index=False)
+
+def _generate_shard(task):
+    index, rows, seed, out_dir, fmt = task
+    df = generate_chunk(rows, seed)
+    path = os.path.join(out_dir, f"shard-{index:05d}.{fmt}")
+    write_shard(df, path, fmt)
+    return {'path': os.path.basename(path), 'rows': rows, 'need_irrigation': int(df['need_irrigation'].sum())}
+
+def generate_shards(n_samples, out_dir, chunk_rows=1_000_000, fmt='npz', workers=None, seed=42):
+    """
+    Stream n_samples rows to out_dir as shards of at most chunk_rows rows.
+    Every shard gets its own child of SeedSequence(seed), so output is
+    reproducible whatever the number of worker processes. Each worker holds
+    one chunk at a time; the parent only keeps shard metadata. A
+    manifest.json listing the shards is written last.
+    """
+    if fmt == 'parquet' and not parquet_available():
+        raise RuntimeError("Parquet output needs pyarrow or fastparquet; use --format npz")
+    
+    os.makedirs(out_dir, exist_ok=True)
+    shard_sizes = [min(chunk_rows, n_samples - start) for start in range(0, n_samples, chunk_rows)]
+    seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    tasks = [(index, rows, seeds[index], out_dir, fmt) for index, rows in enumerate(shard_sizes)]
+    
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        shards = [_generate_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = list(executor.map(_generate_shard, tasks))
+    
+    manifest = {
+        'rows': n_samples,
+        'format': fmt,
+        'seed': seed,
+        'columns': COLUMNS,
+        'shards': shards
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
 if __name__ == "__main__":
-    # Generate training data
-    df = generate_synthetic_irrigation_data(5000)
+    parser = argparse.ArgumentParser(description='Generate synthetic irrigation training data')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--out-dir', default=None,
+                        help='Write vectorized shards here instead of training_data.csv')
+    parser.add_argument('--format', choices=['npz', 'parquet', 'csv'], default='npz',
+                        help='npz needs only numpy; parquet needs pyarrow or fastparquet')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
     
-    # Save to CSV
-    df.to_csv('training_data.csv', index=False)
-    print(f"Generated {len(df)} training samples")
-    print(f"Irrigation needed: {df['need_irrigation'].sum()} samples")
-    print("Training data saved to training_data.csv")
+    if args.out_dir:
+        started = time.time()
+        manifest = generate_shards(args.rows, args.out_dir, args.chunk_rows, args.format,
+                                   args.workers, args.seed)
+        positives = sum(shard['need_irrigation'] for shard in manifest['shards'])
+        print(f"Generated {manifest['rows']} training samples in {len(manifest['shards'])} "
+              f"{args.format} shards ({time.time() - started:.1f}s)")
+        print(f"Irrigation needed: {positives} samples")
+        print(f"Manifest saved to {os.path.join(args.out_dir, 'manifest.json')}")
+    else:
+        # Generate training data
+        df = generate_synthetic_irrigation_data(args.rows)
+        
+        # Save to CSV
+        df.to_csv('training_data.csv', index=False)
+        print(f"Generated {len(df)} training samples")
+        print(f"Irrigation needed: {df['need_irrigation'].sum()} samples")
+        print("Training data saved to training_data.csv")
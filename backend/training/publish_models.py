@@ -0,0 +1,29 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.model_registry import ModelRegistry
+from training.train_large import FEATURE_COLUMNS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Publish trained model artifacts as a new registry version. '
+                    'Running predictors pick up the active version without a restart.'
+    )
+    parser.add_argument('--source', default='../ml_models',
+                        help='Directory holding the .pkl (and optional compiled .npz) artifacts')
+    parser.add_argument('--registry', default=None, help='Registry root (default: ML_MODEL_DIR or backend/ml_models)')
+    parser.add_argument('--version', default=None, help='Version name (default: timestamp)')
+    parser.add_argument('--no-activate', action='store_true', help='Publish without switching CURRENT')
+    parser.add_argument('--activate', default=None, metavar='VERSION',
+                        help='Only switch CURRENT to an existing version (e.g. to roll back)')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.activate:
+        registry.activate(args.activate)
+    else:
+        registry.publish(args.source, args.version, feature_names=FEATURE_COLUMNS,
+                         activate=not args.no_activate)
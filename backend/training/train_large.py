@@ -0,0 +1,247 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import (RandomForestClassifier, RandomForestRegressor,
+                              HistGradientBoostingClassifier, HistGradientBoostingRegressor)
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, classification_report, mean_absolute_error, r2_score
+
+# Same features, in the same order, as models/ml_predictor.py
+FEATURE_COLUMNS = [
+    'soil_moisture_percent', 'temp_max', 'temp_min', 'temp_avg',
+    'humidity', 'wind_speed', 'days_since_irrigation',
+    'growth_stage', 'soil_type_encoded', 'day_of_year'
+]
+TARGET_COLUMNS = ['need_irrigation', 'irrigation_amount_mm']
+
+
+def list_shards(data):
+    """Shard paths for a generate_shards directory (manifest or glob) or a single file"""
+    if os.path.isfile(data):
+        return [data]
+    manifest_path = os.path.join(data, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        return [os.path.join(data, shard['path']) for shard in manifest['shards']]
+    paths = sorted(glob.glob(os.path.join(data, 'shard-*.*')))
+    if not paths:
+        raise FileNotFoundError(f"No shards found in {data}")
+    return paths
+
+
+def read_shard(path, columns):
+    """Only the requested columns of one shard, as numpy arrays"""
+    if path.endswith('.npz'):
+        with np.load(path) as shard:
+            return {column: shard[column] for column in columns}
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    return {column: df[column].to_numpy() for column in columns}
+
+
+def iter_shards(paths, test_size, seed):
+    """
+    Yield (features float32, need, amount, is_test) one shard at a time.
+    The held-out split is drawn per shard from its own seed, so it is
+    stable across runs without ever loading the whole dataset.
+    """
+    for index, path in enumerate(paths):
+        shard = read_shard(path, FEATURE_COLUMNS + TARGET_COLUMNS)
+        features = np.column_stack([shard[column] for column in FEATURE_COLUMNS]).astype(np.float32)
+        rng = np.random.default_rng([seed, index])
+        is_test = rng.random(len(features)) < test_size
+        yield (features, shard['need_irrigation'].astype(bool),
+               shard['irrigation_amount_mm'].astype(np.float32), is_test)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children"""
+    usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+             resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def build_models(model, seed):
+    if model == 'hgb':
+        classifier = HistGradientBoostingClassifier(
+            max_iter=200, learning_rate=0.1, max_leaf_nodes=31,
+            class_weight='balanced', early_stopping=True, random_state=seed
+        )
+        regressor = HistGradientBoostingRegressor(
+            max_iter=200, learning_rate=0.1, max_leaf_nodes=31,
+            early_stopping=True, random_state=seed
+        )
+    else:
+        # Same settings as train_model.py, on every core
+        classifier = RandomForestClassifier(
+            n_estimators=100, max_depth=10, random_state=seed,
+            class_weight='balanced', n_jobs=-1
+        )
+        regressor = RandomForestRegressor(
+            n_estimators=100, max_depth=10, random_state=seed, n_jobs=-1
+        )
+    return classifier, regressor
+
+
+def train_large(data, model='hgb', out_dir='../ml_models', test_size=0.2,
+                max_train_rows=None, seed=42):
+    """
+    Train the irrigation classifier/regressor from sharded data.
+    Pass 1 streams the shards to fit the scaler with partial_fit and count
+    rows; pass 2 scales each shard into preallocated float32 matrices, so
+    peak memory is the training matrix plus one shard. Artifacts are saved
+    under the names models/ml_predictor.py loads.
+    """
+    started = time.time()
+    paths = list_shards(data)
+    print(f"Reading {len(paths)} shard(s) from {data}")
+
+    # Pass 1: scaler statistics and split sizes
+    scaler = StandardScaler()
+    train_rows = test_rows = 0
+    for features, _, _, is_test in iter_shards(paths, test_size, seed):
+        scaler.partial_fit(features[~is_test])
+        train_rows += int((~is_test).sum())
+        test_rows += int(is_test.sum())
+
+    # Optional uniform subsample of the training rows (e.g. for random forests)
+    keep_fraction = 1.0
+    if max_train_rows and train_rows > max_train_rows:
+        keep_fraction = max_train_rows / train_rows
+    print(f"Training rows: {train_rows}, test rows: {test_rows}"
+          + (f", sampling {keep_fraction:.1%} of training rows" if keep_fraction < 1 else ""))
+
+    # Pass 2: scaled float32 matrices
+    capacity = int(train_rows * keep_fraction * 1.01) + 1000 if keep_fraction < 1 else train_rows
+    X_train = np.empty((capacity, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y_need_train = np.empty(capacity, dtype=bool)
+    y_amount_train = np.empty(capacity, dtype=np.float32)
+    X_test = np.empty((test_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y_need_test = np.empty(test_rows, dtype=bool)
+    y_amount_test = np.empty(test_rows, dtype=np.float32)
+
+    sample_rng = np.random.default_rng(seed)
+    train_fill = test_fill = 0
+    for features, need, amount, is_test in iter_shards(paths, test_size, seed):
+        scaled = scaler.transform(features).astype(np.float32)
+
+        keep = ~is_test
+        if keep_fraction < 1:
+            keep &= sample_rng.random(len(features)) < keep_fraction
+        count = min(int(keep.sum()), capacity - train_fill)
+        X_train[train_fill:train_fill + count] = scaled[keep][:count]
+        y_need_train[train_fill:train_fill + count] = need[keep][:count]
+        y_amount_train[train_fill:train_fill + count] = amount[keep][:count]
+        train_fill += count
+
+        count = int(is_test.sum())
+        X_test[test_fill:test_fill + count] = scaled[is_test]
+        y_need_test[test_fill:test_fill + count] = need[is_test]
+        y_amount_test[test_fill:test_fill + count] = amount[is_test]
+        test_fill += count
+
+    X_train, y_need_train, y_amount_train = X_train[:train_fill], y_need_train[:train_fill], y_amount_train[:train_fill]
+    load_seconds = time.time() - started
+    print(f"Loaded {train_fill} training rows in {load_seconds:.1f}s (peak RSS {peak_rss_mb():.0f} MB)")
+
+    classifier, regressor = build_models(model, seed)
+
+    print(f"Training irrigation need classifier ({model})...")
+    stage_started = time.time()
+    classifier.fit(X_train, y_need_train)
+    classifier_seconds = time.time() - stage_started
+
+    # Only train on samples where irrigation is needed
+    print("Training irrigation amount regressor...")
+    stage_started = time.time()
+    irrigation_mask = y_need_train
+    if not irrigation_mask.any():
+        print("No irrigation samples found for training regressor!")
+        return None
+    regressor.fit(X_train[irrigation_mask], y_amount_train[irrigation_mask])
+    regressor_seconds = time.time() - stage_started
+    print(f"Trained regressor on {int(irrigation_mask.sum())} irrigation samples")
+
+    print("\n=== Classification Results ===")
+    y_need_pred = classifier.predict(X_test)
+    accuracy = accuracy_score(y_need_test, y_need_pred)
+    print(classification_report(y_need_test, y_need_pred))
+
+    print("\n=== Regression Results ===")
+    test_mask = y_need_test
+    mae = r2 = None
+    if test_mask.any():
+        y_amount_pred = regressor.predict(X_test[test_mask])
+        mae = mean_absolute_error(y_amount_test[test_mask], y_amount_pred)
+        r2 = r2_score(y_amount_test[test_mask], y_amount_pred)
+        print(f"Mean Absolute Error: {mae:.2f} mm")
+        print(f"R² Score: {r2:.3f}")
+        print(f"Evaluated on {int(test_mask.sum())} irrigation test samples")
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Compiled forests here were built from the pickles about to be replaced
+    for name in ('irrigation_classifier.npz', 'irrigation_regressor.npz'):
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Removed stale {name}; rerun compile_models.py for forest models")
+
+    artifacts = {
+        'irrigation_classifier.pkl': classifier,
+        'irrigation_regressor.pkl': regressor,
+        'feature_scaler.pkl': scaler
+    }
+    sizes = {}
+    for name, artifact in artifacts.items():
+        path = os.path.join(out_dir, name)
+        joblib.dump(artifact, path)
+        sizes[name] = os.path.getsize(path)
+
+    report = {
+        'model': model,
+        'train_rows': int(train_fill),
+        'test_rows': int(test_rows),
+        'accuracy': round(float(accuracy), 4),
+        'regression_mae_mm': None if mae is None else round(float(mae), 3),
+        'regression_r2': None if r2 is None else round(float(r2), 4),
+        'load_seconds': round(load_seconds, 1),
+        'classifier_seconds': round(classifier_seconds, 1),
+        'regressor_seconds': round(regressor_seconds, 1),
+        'wall_seconds': round(time.time() - started, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 0),
+        'model_size_mb': {name: round(size / 1024 / 1024, 2) for name, size in sizes.items()}
+    }
+
+    print("\n=== Training Report ===")
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    print(f"\nModels saved to {os.path.abspath(out_dir)}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train irrigation models from sharded data')
+    parser.add_argument('--data', default='training_data.csv',
+                        help='Shard directory from generate_training_data.py --out-dir, or one CSV/Parquet/NPZ file')
+    parser.add_argument('--model', choices=['hgb', 'rf'], default='hgb',
+                        help='hgb: histogram gradient boosting; rf: random forest on all cores')
+    parser.add_argument('--out-dir', default='../ml_models')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--max-train-rows', type=int, default=None,
+                        help='Uniformly subsample the training rows to at most this many')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    train_large(args.data, args.model, args.out_dir, args.test_size, args.max_train_rows, args.seed)
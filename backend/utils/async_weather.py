@@ -0,0 +1,87 @@
+import asyncio
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = int(os.getenv('WEATHER_FETCH_CONCURRENCY', 8))
+DEFAULT_DEADLINE = float(os.getenv('WEATHER_FETCH_DEADLINE', 8))
+
+
+async def fetch_weather_many(client, locations, concurrency=DEFAULT_CONCURRENCY,
+                             deadline=DEFAULT_DEADLINE, days=7, key_locations=None):
+    """
+    Fetch forecasts for many locations with bounded concurrency.
+    The blocking WeatherAPIClient calls run on a small thread pool driven by
+    asyncio; each upstream request gets its own deadline and falls back to
+    get_fallback_weather_data on failure. Locations sharing a cache key are
+    fetched once; key_locations, if given, replace the locations when
+    building those keys. Returns one entry per input location, in order.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    unique = {}
+    request_keys = []
+    for location, key_location in zip(locations, key_locations or locations):
+        location_str = client.clean_location_parameter(location)
+        request_key = client.make_request_key(client.clean_location_parameter(key_location), days)
+        request_keys.append(request_key)
+        unique.setdefault(request_key, (location, location_str))
+
+    def fetch_within(request_key, location_str, started):
+        # Runs on the pool: a single try, timed out by what is left of the
+        # deadline, so a thread abandoned by wait_for finishes soon after
+        remaining = max(0.1, deadline - (time.monotonic() - started))
+        timeout = (min(client.timeout[0], remaining), remaining)
+        return client.inflight.do(
+            request_key,
+            lambda: client.fetch_and_cache(request_key, location_str, days, timeout=timeout,
+                                           session=client.single_try_session)
+        )
+
+    async def fetch_one(executor, request_key, location, location_str):
+        if client.cache:
+            cached = await loop.run_in_executor(executor, client.cache.get, request_key)
+            if cached is not None:
+                return request_key, cached, 'cache'
+
+        async with semaphore:
+            try:
+                weather_data = await asyncio.wait_for(
+                    loop.run_in_executor(executor, fetch_within, request_key, location_str, time.monotonic()),
+                    timeout=deadline
+                )
+                return request_key, weather_data, 'api'
+            except Exception as e:
+                print(f"Weather fetch failed for {location_str}: {e!r}")
+                return request_key, client.get_fallback_weather_data(days, location), 'fallback'
+
+    # Headroom over the semaphore so threads still finishing an abandoned
+    # request don't hold back the next locations
+    executor = ThreadPoolExecutor(max_workers=concurrency * 2)
+    try:
+        fetched = await asyncio.gather(*[
+            fetch_one(executor, request_key, location, location_str)
+            for request_key, (location, location_str) in unique.items()
+        ])
+    finally:
+        # Don't wait for threads whose deadline already passed
+        executor.shutdown(wait=False)
+
+    by_key = {request_key: (weather_data, source) for request_key, weather_data, source in fetched}
+    results = []
+    for location, request_key in zip(locations, request_keys):
+        weather_data, source = by_key[request_key]
+        results.append({
+            'location': location,
+            'key': request_key,
+            'weather': copy.deepcopy(weather_data),
+            'source': source
+        })
+    return results
+
+
+def fetch_weather_for_locations(client, locations, **kwargs):
+    """Synchronous entry point for batch jobs and request handlers"""
+    return asyncio.run(fetch_weather_many(client, locations, **kwargs))
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker"""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    After `failure_threshold` consecutive failures calls are rejected for
+    `recovery_timeout` seconds, then a single probe call is let through.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, recovery_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    def allow_request(self):
+        """True if a call may go upstream now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    self.short_circuited += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                # Only one probe at a time while the provider is suspect
+                if self.probe_in_flight:
+                    self.short_circuited += 1
+                    return False
+                self.probe_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None,
+                'short_circuited': self.short_circuited,
+                'times_opened': self.times_opened
+            }
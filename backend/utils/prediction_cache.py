@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+
+from utils.ttl_cache import TTLCache
+
+# Bucket width per model feature (0 = exact). temp_avg is not bucketed on
+# its own: it is recomputed from the bucketed max/min temperatures.
+DEFAULT_BUCKETS = {
+    'soil_moisture_percent': 1.0,
+    'temp_max': 0.5,
+    'temp_min': 0.5,
+    'humidity': 2.0,
+    'wind_speed': 0.5,
+    'days_since_irrigation': 0,
+    'growth_stage': 0,
+    'soil_type_encoded': 0,
+    'day_of_year': 0
+}
+DERIVED_FEATURE = 'temp_avg'
+
+
+def parse_buckets(spec):
+    """'soil_moisture_percent=2,humidity=5' -> {feature: width}"""
+    buckets = {}
+    for part in filter(None, (item.strip() for item in (spec or '').split(','))):
+        name, _, width = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_BUCKETS:
+            raise ValueError(f"Unknown feature '{name}' in prediction cache buckets")
+        width = float(width)
+        if width < 0:
+            raise ValueError(f"Bucket width for {name} must not be negative")
+        buckets[name] = width
+    return buckets
+
+
+class PredictionCache:
+    """
+    LRU cache of ML predictions keyed on quantized feature vectors.
+    Each feature is snapped to the nearest multiple of its bucket width and
+    the model is run on that representative row, so every input in a bucket
+    gets the same (cached) answer. Keys include the model version, so a
+    reloaded model never serves stale entries.
+    """
+
+    def __init__(self, feature_names, buckets=None, max_entries=10000):
+        widths = {**DEFAULT_BUCKETS, **(buckets or {})}
+        self.feature_names = list(feature_names)
+        self.widths = np.array([widths.get(name, 0) for name in self.feature_names], dtype=np.float64)
+        self.derived = self.feature_names.index(DERIVED_FEATURE)
+        self.key_columns = [i for i in range(len(self.feature_names)) if i != self.derived]
+        self.cache = TTLCache(max_entries=max_entries)
+
+    @classmethod
+    def from_env(cls, feature_names):
+        """A cache if ML_PREDICTION_CACHE is on, else None"""
+        if os.getenv('ML_PREDICTION_CACHE', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            feature_names,
+            buckets=parse_buckets(os.getenv('ML_PREDICTION_CACHE_BUCKETS')),
+            max_entries=int(os.getenv('ML_PREDICTION_CACHE_MAX_ENTRIES', 10000))
+        )
+
+    def quantize(self, features):
+        """(bucket keys, representative rows) for an (n, features) matrix"""
+        features = np.asarray(features, dtype=np.float64)
+        bucketed = self.widths > 0
+        steps = np.where(bucketed, np.round(features / np.where(bucketed, self.widths, 1)), features)
+        representative = np.where(bucketed, steps * self.widths, features)
+        temp_max, temp_min = self.feature_names.index('temp_max'), self.feature_names.index('temp_min')
+        representative[:, self.derived] = (representative[:, temp_max] + representative[:, temp_min]) / 2
+        return steps[:, self.key_columns], representative
+
+    def predict(self, features, version, predict_rows):
+        """
+        (need, amount, probability) arrays for features. Rows sharing a bucket
+        are looked up once; cache misses go to predict_rows in a single call.
+        """
+        keys, representative = self.quantize(features)
+        if len(keys) == 1:
+            key = (version, tuple(keys[0].tolist()))
+            result = self.cache.get(key)
+            if result is None:
+                need, amount, probability = predict_rows(representative)
+                result = (bool(need[0]), float(amount[0]), float(probability[0]))
+                self.cache.set(key, result)
+            return np.array([result[0]]), np.array([result[1]]), np.array([result[2]])
+
+        unique_keys, first_row, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        results = [self.cache.get((version, tuple(key.tolist()))) for key in unique_keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            need, amount, probability = predict_rows(representative[first_row[missing]])
+            for j, i in enumerate(missing):
+                results[i] = (bool(need[j]), float(amount[j]), float(probability[j]))
+                self.cache.set((version, tuple(unique_keys[i].tolist())), results[i])
+
+        need, amount, probability = (np.array(column) for column in zip(*results))
+        return need[inverse].astype(bool), amount[inverse], probability[inverse]
+
+    def stats(self):
+        return {
+            **self.cache.stats(),
+            'buckets': {name: float(width) for name, width in zip(self.feature_names, self.widths)
+                        if name != DERIVED_FEATURE}
+        }
@@ -4,9 +4,30 @@ from PIL import Image
 import tensorflow as tf
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing import image
+import io
 import json
 import os
 
+def image_bytes(source):
+    """
+    Raw encoded bytes from an upload (bytes or a file-like object such as
+    Flask's FileStorage); a path is returned unchanged.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return source.read()
+    return source
+
+def decode_image(source, flags=cv2.IMREAD_COLOR):
+    """Decode an image in memory with cv2.imdecode (or read a path); None if undecodable"""
+    source = image_bytes(source)
+    if isinstance(source, bytes):
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+    return cv2.imread(source, flags)
+
 class SoilImageClassifier:
     def __init__(self):
         self.model = None
@@ -41,11 +62,12 @@ class SoilImageClassifier:
             3: "Sandy Loam"
         }
     
-    def preprocess_image(self, image_path):
-        """Preprocess image for model prediction"""
+    def preprocess_image(self, image_source):
+        """Preprocess image (bytes, file-like or path) for model prediction"""
         try:
             # Load and resize image
-            img = Image.open(image_path)
+            image_source = image_bytes(image_source)
+            img = Image.open(io.BytesIO(image_source) if isinstance(image_source, bytes) else image_source)
             img = img.convert('RGB')
             img = img.resize(self.img_size)
             
@@ -59,16 +81,18 @@ class SoilImageClassifier:
             print(f"Error preprocessing image: {e}")
             return None
     
-    def predict_soil_type(self, image_path):
-        """Predict soil type from image"""
+    def predict_soil_type(self, image_source):
+        """Predict soil type from image bytes, a file-like upload or a path"""
+        # Read an upload stream once; the fallback may need the bytes again
+        image_source = image_bytes(image_source)
         try:
             if self.model is None:
-                return self.fallback_prediction(image_path)
+                return self.fallback_prediction(image_source)
             
             # Preprocess image
-            processed_image = self.preprocess_image(image_path)
+            processed_image = self.preprocess_image(image_source)
             if processed_image is None:
-                return self.fallback_prediction(image_path)
+                return self.fallback_prediction(image_source)
             
             # Make prediction
             predictions = self.model.predict(processed_image)
@@ -95,13 +119,13 @@ class SoilImageClassifier:
             
         except Exception as e:
             print(f"Prediction error: {e}")
-            return self.fallback_prediction(image_path)
+            return self.fallback_prediction(image_source)
     
-    def fallback_prediction(self, image_path):
+    def fallback_prediction(self, image_source):
         """Fallback prediction using image analysis"""
         try:
             # Simple color-based classification as fallback
-            img = cv2.imread(image_path)
+            img = decode_image(image_source)
             img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             
             # Calculate mean color values
@@ -141,10 +165,10 @@ class SoilImageClassifier:
                 'method': 'default_fallback'
             }
 
-    def extract_soil_features(self, image_path):
-        """Extract soil texture features from image"""
+    def extract_soil_features(self, image_source):
+        """Extract soil texture features from image bytes, a file-like upload or a path"""
         try:
-            img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            img = decode_image(image_source, cv2.IMREAD_GRAYSCALE)
             
             # Calculate texture features
             # Variance (texture roughness)
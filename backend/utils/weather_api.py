@@ -1,7 +1,41 @@
+import base64
 import requests
 import json
+import numpy as np
 from datetime import datetime, timedelta
 
+# Row order of the packed hourly block
+HOURLY_COLUMNS = ['temp', 'humidity', 'wind_speed', 'cloud', 'precip']
+
+def compact_hourly(hours):
+    """
+    Pack forecastday[].hour into one base64 string of (columns, 24)
+    little-endian float32, instead of 24 dicts or 120 Python floats.
+    Returns None unless all 24 hours are present.
+    """
+    if len(hours) != 24:
+        return None
+    columns = np.array([
+        [hour.get('temp_c', 25) for hour in hours],
+        [hour.get('humidity', 50) for hour in hours],
+        [float(hour.get('wind_kph', 0)) / 3.6 for hour in hours],  # m/s
+        [hour.get('cloud', 50) for hour in hours],
+        [hour.get('precip_mm', 0) for hour in hours]
+    ], dtype='<f4')
+    return base64.b64encode(columns.tobytes()).decode('ascii')
+
+def decode_hourly(packed):
+    """(columns, 24) float32 array from compact_hourly output, or None if malformed"""
+    if not isinstance(packed, str):
+        return None
+    try:
+        raw = base64.b64decode(packed, validate=True)
+    except ValueError:
+        return None
+    if len(raw) != len(HOURLY_COLUMNS) * 24 * 4:
+        return None
+    return np.frombuffer(raw, dtype='<f4').reshape(len(HOURLY_COLUMNS), 24)
+
 class WeatherAPIClient:
     def __init__(self, api_key):
         self.api_key = api_key
@@ -73,6 +107,10 @@ class WeatherAPIClient:
                 'daylight_hours': self.calculate_daylight_hours(astro['sunrise'], astro['sunset'])
             }
             
+            hourly = compact_hourly(day_data.get('hour', []))
+            if hourly:
+                processed_day['hourly'] = hourly
+            
             weather_data.append(processed_day)
         
         return weather_data
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'weather_cache.db'
+)
+
+
+class WeatherCache:
+    """
+    TTL + LRU cache for processed forecasts, stored in a local SQLite file
+    so every gunicorn worker on the host shares the same entries.
+    Keys are the cleaned location, with coordinates snapped to a lat/lon grid.
+    """
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None, grid_degrees=None):
+        self.path = path or os.getenv('WEATHER_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None
+                                 else os.getenv('WEATHER_CACHE_TTL', 3600))
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv('WEATHER_CACHE_MAX_ENTRIES', 2000))
+        self.grid_degrees = float(grid_degrees if grid_degrees is not None
+                                  else os.getenv('WEATHER_CACHE_GRID', 0.1))
+        self.enabled = self.ttl_seconds > 0 and self.max_entries > 0
+
+        # Per-process counters; entry counts come from the shared store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.enabled:
+            try:
+                self._init_store()
+            except sqlite3.Error as e:
+                print(f"Weather cache disabled, could not open {self.path}: {e}")
+                self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_store(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_weather_cache_access '
+                         'ON weather_cache (last_access)')
+
+    def snap_coordinate(self, value):
+        """Snap a coordinate to the configured grid"""
+        if self.grid_degrees <= 0:
+            return round(value, 4)
+        return round(round(value / self.grid_degrees) * self.grid_degrees, 4)
+
+    def make_key(self, location_str, days):
+        """Cache key for a cleaned location string and forecast length"""
+        location_str = str(location_str).strip()
+        parts = [part.strip() for part in location_str.split(',')]
+        if len(parts) == 2:
+            try:
+                lat = self.snap_coordinate(float(parts[0]))
+                lon = self.snap_coordinate(float(parts[1]))
+                return f"grid:{lat:.4f},{lon:.4f}|{days}"
+            except ValueError:
+                pass
+        return f"name:{' '.join(location_str.lower().split())}|{days}"
+
+    def get(self, key, count=True):
+        """Return cached weather data or None on miss/expiry; count=False leaves the hit/miss counters alone"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT payload, expires_at FROM weather_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+                if row is None or row[1] <= now:
+                    if row is not None:
+                        conn.execute('DELETE FROM weather_cache WHERE cache_key = ?', (key,))
+                    if count:
+                        self._count('misses')
+                    return None
+
+                conn.execute('UPDATE weather_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+            if count:
+                self._count('hits')
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Weather cache read error: {e}")
+            if count:
+                self._count('misses')
+            return None
+
+    def set(self, key, weather_data):
+        """Store weather data and evict least recently used entries past the limit"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        try:
+            payload = json.dumps(weather_data)
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO weather_cache '
+                    '(cache_key, payload, created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                    (key, payload, now, now + self.ttl_seconds, now)
+                )
+                conn.execute('DELETE FROM weather_cache WHERE expires_at <= ?', (now,))
+                evicted = conn.execute(
+                    'DELETE FROM weather_cache WHERE cache_key IN ('
+                    ' SELECT cache_key FROM weather_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?'
+                    ')', (self.max_entries,)
+                ).rowcount
+            if evicted > 0:
+                self._count('evictions', evicted)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Weather cache write error: {e}")
+
+    def expires_at(self, key):
+        """Expiry timestamp of a live entry, or None"""
+        if not self.enabled:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT expires_at FROM weather_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+            return row[0] if row and row[0] > time.time() else None
+        except sqlite3.Error:
+            return None
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._connect() as conn:
+            conn.execute('DELETE FROM weather_cache')
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        """Hit/miss counters for this worker plus the shared entry count"""
+        entries = 0
+        if self.enabled:
+            try:
+                with self._connect() as conn:
+                    entries = conn.execute('SELECT COUNT(*) FROM weather_cache').fetchone()[0]
+            except sqlite3.Error:
+                pass
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'grid_degrees': self.grid_degrees
+            }
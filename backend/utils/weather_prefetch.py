@@ -0,0 +1,68 @@
+import time
+from utils.circuit_breaker import CircuitOpenError
+
+
+class RateLimiter:
+    """Spaces calls evenly so a job stays under a per-minute quota"""
+
+    def __init__(self, max_per_minute):
+        self.min_interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self.last_call = None
+
+    def wait(self):
+        if self.last_call is not None and self.min_interval:
+            remaining = self.min_interval - (time.monotonic() - self.last_call)
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last_call = time.monotonic()
+
+
+def collect_recent_locations(reports):
+    """Location payloads saved with recent reports, newest first"""
+    locations = []
+    for report in reports:
+        summary = (report.report_data or {}).get('summary', {})
+        location = summary.get('user_data', {}).get('location')
+        if location:
+            locations.append(location)
+    return locations
+
+
+def prefetch_weather(calculator, locations, max_per_minute=30, max_locations=200, days=7):
+    """
+    Refresh the weather cache for distinct locations.
+    Locations that map to the same cache key are fetched once, and the run
+    stops early if the circuit breaker opens.
+    """
+    client = calculator.weather_client
+    seen = set()
+    queries = []
+    for location in locations:
+        location_query = calculator.resolve_location_query(location)
+        key_location = calculator.resolve_cache_location(location)
+        request_key = client.make_request_key(client.clean_location_parameter(key_location), days)
+        if request_key in seen:
+            continue
+        seen.add(request_key)
+        queries.append((location_query, key_location))
+        if len(queries) >= max_locations:
+            break
+
+    limiter = RateLimiter(max_per_minute)
+    refreshed = 0
+    failed = 0
+
+    for location_query, key_location in queries:
+        limiter.wait()
+        try:
+            client.refresh_cache(location_query, days=days, key_location=key_location)
+            refreshed += 1
+        except CircuitOpenError:
+            print("Weather prefetch stopped: circuit breaker is open")
+            break
+        except Exception as e:
+            failed += 1
+            print(f"Weather prefetch failed for {location_query}: {e}")
+
+    print(f"Weather prefetch: {refreshed} refreshed, {failed} failed, {len(queries)} locations")
+    return {'locations': len(queries), 'refreshed': refreshed, 'failed': failed}
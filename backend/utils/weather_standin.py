@@ -0,0 +1,267 @@
+"""
+Local stand-in for api.weatherapi.com used for offline benchmarks and load tests.
+
+Serves /v1/forecast.json in the shape WeatherAPIClient.process_weather_data
+consumes. Three modes:
+  synthetic  deterministic forecasts generated from the location string
+  record     proxy to the real API and save every response to --data-dir
+  replay     serve previously recorded responses from --data-dir
+
+Point the backend at it with WEATHER_API_BASE_URL=http://127.0.0.1:8765/v1
+and WEATHER_API_KEY=local-standin-weather-api-key (the stand-in does not
+check keys, but the client still requires one).
+
+    python -m utils.weather_standin --port 8765 --latency-ms 150 --error-rate 0.05
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+UPSTREAM_BASE_URL = 'http://api.weatherapi.com/v1'
+
+CONDITIONS = ['Sunny', 'Partly cloudy', 'Cloudy', 'Patchy rain possible', 'Moderate rain']
+
+
+def synthetic_forecast(location, days=7, start_date=None):
+    """Deterministic forecast.json payload for a location string"""
+    rng = random.Random(zlib.crc32(location.strip().lower().encode('utf-8')))
+    start_date = start_date or datetime.now().date()
+
+    base_max = rng.uniform(28, 38)
+    base_min = base_max - rng.uniform(8, 13)
+    base_humidity = rng.uniform(35, 80)
+
+    forecastday = []
+    for i in range(days):
+        date = start_date + timedelta(days=i)
+        temp_max = round(base_max + rng.gauss(0, 1.5), 1)
+        temp_min = round(base_min + rng.gauss(0, 1.5), 1)
+        humidity = int(min(100, max(10, base_humidity + rng.gauss(0, 8))))
+        wind_kph = round(max(0, rng.gauss(14, 5)), 1)
+        rain_mm = round(rng.expovariate(1.0) if rng.random() < 0.3 else 0.0, 1)
+        cloud = int(min(100, max(0, rng.gauss(40, 25))))
+        uv = round(min(11, max(1, rng.gauss(7, 2))), 1)
+
+        hours = []
+        for hour in range(24):
+            # Diurnal temperature cycle peaking mid-afternoon
+            phase = math.cos(math.pi * (hour - 15) / 12)
+            hours.append({
+                'time': f"{date.isoformat()} {hour:02d}:00",
+                'temp_c': round((temp_max + temp_min) / 2 + (temp_max - temp_min) / 2 * phase, 1),
+                'humidity': int(min(100, max(5, humidity - 15 * phase))),
+                'wind_kph': round(max(0, wind_kph * (0.6 + 0.4 * max(0, phase)) + rng.gauss(0, 1)), 1),
+                'cloud': int(min(100, max(0, cloud + rng.gauss(0, 10)))),
+                'uv': round(uv * max(0, math.sin(math.pi * (hour - 6) / 12)), 1) if 6 <= hour <= 18 else 0,
+                'precip_mm': round(rain_mm / 24, 2),
+                'is_day': 1 if 6 <= hour < 18 else 0
+            })
+
+        forecastday.append({
+            'date': date.isoformat(),
+            'day': {
+                'maxtemp_c': temp_max,
+                'mintemp_c': temp_min,
+                'avgtemp_c': round((temp_max + temp_min) / 2, 1),
+                'avghumidity': humidity,
+                'maxwind_kph': wind_kph,
+                'totalprecip_mm': rain_mm,
+                'daily_chance_of_rain': 80 if rain_mm > 0 else 10,
+                'uv': uv,
+                'condition': {'text': CONDITIONS[min(len(CONDITIONS) - 1, int(rain_mm * 2) + (cloud > 60))]}
+            },
+            'astro': {'sunrise': '06:10 AM', 'sunset': '06:25 PM'},
+            'hour': hours
+        })
+
+    return {
+        'location': {'name': location, 'localtime': datetime.now().strftime('%Y-%m-%d %H:%M')},
+        'current': {'temp_c': forecastday[0]['day']['avgtemp_c'] if forecastday else None},
+        'forecast': {'forecastday': forecastday}
+    }
+
+
+def rebase_dates(payload, start_date=None):
+    """Shift a recorded payload so its first forecast day is today"""
+    start_date = start_date or datetime.now().date()
+    for i, day in enumerate(payload.get('forecast', {}).get('forecastday', [])):
+        date = (start_date + timedelta(days=i)).isoformat()
+        for hour in day.get('hour', []):
+            hour['time'] = f"{date} {hour['time'][-5:]}"
+        day['date'] = date
+    return payload
+
+
+class StandinConfig:
+    def __init__(self, mode='synthetic', data_dir='weather_recordings', latency_ms=0,
+                 jitter_ms=0, error_rate=0.0, upstream_url=UPSTREAM_BASE_URL,
+                 upstream_key=None, seed=None, rebase=True):
+        if mode not in ('synthetic', 'record', 'replay'):
+            raise ValueError(f"Unknown stand-in mode: {mode}")
+        self.mode = mode
+        self.data_dir = data_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.upstream_url = upstream_url
+        self.upstream_key = upstream_key or os.getenv('WEATHER_API_KEY')
+        self.rebase = rebase
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.errors_injected = 0
+
+    def recording_path(self, location, days):
+        name = re.sub(r'[^a-z0-9.,_-]+', '_', location.strip().lower())
+        return os.path.join(self.data_dir, f"{name}__{days}.json")
+
+
+class StandinHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once; the default backlog is 5
+    request_queue_size = 128
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.config
+        url = urlparse(self.path)
+        if not url.path.endswith('/forecast.json'):
+            self.send_json(404, {'error': {'code': 1005, 'message': 'API request url is invalid.'}})
+            return
+
+        params = parse_qs(url.query)
+        location = params.get('q', [''])[0]
+        days = int(params.get('days', ['7'])[0])
+        if not location:
+            self.send_json(400, {'error': {'code': 1003, 'message': 'Parameter q is missing.'}})
+            return
+
+        with config.lock:
+            config.requests_served += 1
+            delay = config.latency_ms + config.rng.uniform(0, config.jitter_ms)
+            inject_error = config.rng.random() < config.error_rate
+            if inject_error:
+                config.errors_injected += 1
+
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if inject_error:
+            self.send_json(503, {'error': {'code': 9999, 'message': 'Injected stand-in error.'}})
+            return
+
+        if config.mode == 'synthetic':
+            self.send_json(200, synthetic_forecast(location, days))
+        elif config.mode == 'record':
+            self.proxy_and_record(location, days, params)
+        else:
+            self.replay(location, days)
+
+    def proxy_and_record(self, location, days, params):
+        config = self.config
+        upstream_params = {key: values[0] for key, values in params.items()}
+        if config.upstream_key:
+            upstream_params['key'] = config.upstream_key
+
+        try:
+            response = requests.get(f"{config.upstream_url}/forecast.json",
+                                    params=upstream_params, timeout=15)
+        except requests.RequestException as e:
+            self.send_json(502, {'error': {'code': 9998, 'message': f'Upstream error: {e}'}})
+            return
+
+        payload = response.json()
+        if response.status_code == 200:
+            os.makedirs(config.data_dir, exist_ok=True)
+            with open(config.recording_path(location, days), 'w') as f:
+                json.dump(payload, f)
+        self.send_json(response.status_code, payload)
+
+    def replay(self, location, days):
+        config = self.config
+        path = config.recording_path(location, days)
+        if not os.path.exists(path):
+            self.send_json(400, {'error': {'code': 1006, 'message': 'No matching location found.'}})
+            return
+
+        with open(path) as f:
+            payload = json.load(f)
+        if config.rebase:
+            payload = rebase_dates(payload)
+        self.send_json(200, payload)
+
+
+def make_standin_server(host='127.0.0.1', port=0, **options):
+    """Build a stand-in server for the given StandinConfig options"""
+    config = StandinConfig(**options)
+    handler = type('ConfiguredStandinHandler', (StandinHandler,), {'config': config})
+    server = StandinHTTPServer((host, port), handler)
+    server.config = config
+    return server
+
+
+def start_standin_server(host='127.0.0.1', port=0, **options):
+    """Start the stand-in on a background thread; returns (server, base_url)"""
+    server = make_standin_server(host, port, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local WeatherAPI stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=['synthetic', 'record', 'replay'], default='synthetic')
+    parser.add_argument('--data-dir', default='weather_recordings',
+                        help='Directory for recorded responses (record/replay)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Fixed latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Extra random latency per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latency/error injection')
+    parser.add_argument('--upstream-url', default=UPSTREAM_BASE_URL)
+    parser.add_argument('--no-rebase', action='store_true', help='Replay recorded dates unchanged')
+    args = parser.parse_args()
+
+    server = make_standin_server(
+        args.host, args.port,
+        mode=args.mode, data_dir=args.data_dir, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        upstream_url=args.upstream_url, seed=args.seed, rebase=not args.no_rebase
+    )
+
+    print(f"Weather stand-in ({args.mode}) on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()